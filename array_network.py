@@ -0,0 +1,234 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from network import Network
+from run_config import RunConfig
+from snapshot_cache import load_compiled
+
+
+class CSRAdjacency:
+    """
+    Read-only adjacency in CSR form that answers like Network.adj / rev_adj:
+    `adj.get(node)` is a list of (neighbor, channel) pairs.
+    """
+
+    def __init__(self, offsets, neighbors: array, chans: array, edges, order=None):
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.chans = chans
+        # edge ids (2 * channel + d) of the direction the pair is traversed in
+        self.edges = edges
+        # iteration order of the dict-based adjacency (first node seen first)
+        self.order = order
+
+    def get(self, node: int, default=None) -> List[Tuple[int, int]]:
+        try:
+            a, b = self.offsets[node], self.offsets[node + 1]
+        except (IndexError, TypeError):
+            return default
+        return list(zip(self.neighbors[a:b], self.chans[a:b]))
+
+    def __getitem__(self, node: int) -> List[Tuple[int, int]]:
+        out = self.get(node)
+        if out is None:
+            raise KeyError(node)
+        return out
+
+    def __contains__(self, node) -> bool:
+        return isinstance(node, int) and 0 <= node < len(self.offsets) - 1
+
+    def __iter__(self):
+        if self.order is not None:
+            return iter(self.order)
+        return (x for x in range(len(self.offsets) - 1) if self.offsets[x] != self.offsets[x + 1])
+
+    def __len__(self) -> int:
+        if self.order is not None:
+            return len(self.order)
+        return sum(1 for _ in self)
+
+    def degree(self, node: int) -> int:
+        return self.offsets[node + 1] - self.offsets[node]
+
+
+class ArrayNetwork(Network):
+    """
+    Struct-of-arrays Network backend built straight from a CompiledSnapshot.
+
+    - Nodes are dense ints (index into `node_ids`, sorted pubkeys), so `nodes`
+      is in the same order as for Network.
+    - Channel ids are ints (index into `chan_ids`, snapshot order).
+    - Per-direction fields live in columns indexed by edge id `2 * channel + d`
+      (d = 0 for u->v): capacity, htlc_min, htlc_max, base_fee, fee_rate, delay.
+    - `adj` / `rev_adj` are CSR views with the same neighbor order as Network.
+    """
+
+    def __init__(self, snapshot_path: str, run_config: RunConfig = None):
+        snap = load_compiled(snapshot_path)
+        self.snapshot = snap
+        self.snapshot_path = snapshot_path
+        self.run_config = run_config or RunConfig.from_module()
+        n, num_channels = snap.num_nodes, snap.num_channels
+
+        self.node_ids: List[str] = snap.node_ids
+        self.nodes = list(range(n))
+        self.chan_ids: List[str] = snap.chan_ids
+        self._chan_index: Dict[str, int] = None
+
+        # static columns stay in the mapped file
+        self.chan_u = snap.chan_u
+        self.chan_v = snap.chan_v
+        self.total_capacity = snap.total_capacity
+        self.htlc_min = snap.htlc_min
+        self.htlc_max = snap.htlc_max
+        self.base_fee = snap.base_fee
+        self.fee_rate = snap.fee_rate
+        self.delay = snap.delay
+        self.flags = snap.flags
+        # amount range (sats) each direction admits: the size and HTLC checks
+        # folded into one interval test, min_amount[e] <= amount <= max_amount[e]
+        self.min_amount = array('q', [-(-h // 1000) for h in self.htlc_min])
+        self.max_amount = array('q', [
+            min(self.total_capacity[e >> 1], h // 1000) for e, h in enumerate(self.htlc_max)
+        ])
+
+        # dynamic state
+        self.capacity = array('q', bytes(16 * num_channels))
+        split = self.run_config.split_channel_percent
+        for c, total in enumerate(self.total_capacity):
+            half = int(total * split)
+            self.capacity[2 * c] = half
+            self.capacity[2 * c + 1] = total - half
+        self.online = bytearray(b'\x01') * num_channels
+
+        chan_u, chan_v = self.chan_u, self.chan_v
+        adj_edges, rev_edges = snap.adj_edges, snap.rev_edges
+        self.adj = CSRAdjacency(
+            snap.adj_offsets,
+            array('I', [chan_u[e >> 1] if e & 1 else chan_v[e >> 1] for e in adj_edges]),
+            array('I', [e >> 1 for e in adj_edges]),
+            adj_edges,
+            order=snap.adj_order,
+        )
+        self.rev_adj = CSRAdjacency(
+            snap.rev_offsets,
+            array('I', [chan_v[e >> 1] if e & 1 else chan_u[e >> 1] for e in rev_edges]),
+            array('I', [e >> 1 for e in rev_edges]),
+            rev_edges,
+        )
+
+        self._graph = None
+        self.embeddings = {}
+        self.stab_msg_count = 0
+        self._first_channel = None
+        self._amount_breakpoints = None
+        self._adj_views = OrderedDict()
+
+
+    def get_neighbors(self, node_id: int) -> List[Tuple[int, int]]:
+        return self.adj.get(node_id, [])
+
+
+    def node_index(self, pubkey: str) -> int:
+        """
+        Dense id of a pubkey (binary search over the sorted node table).
+        """
+        lo = bisect_left(self.node_ids, pubkey)
+        if lo < len(self.node_ids) and self.node_ids[lo] == pubkey:
+            return lo
+        return None
+
+
+    # Channel accessors: `from_node` must be an endpoint of the channel.
+
+    def edge_key(self, u: int, v: int) -> int:
+        return u * len(self.node_ids) + v
+
+    _pair_key = edge_key
+
+    def node_slots(self) -> range:
+        return range(len(self.node_ids))
+
+    def channel_ids(self) -> List[int]:
+        return list(range(len(self.chan_ids)))
+
+    def channel_by_id(self, short_channel_id: str) -> int:
+        if self._chan_index is None:
+            self._chan_index = {scid: c for c, scid in enumerate(self.chan_ids)}
+        return self._chan_index.get(short_channel_id)
+
+    def _build_view(self, kind: str, amount_sat: int) -> CSRAdjacency:
+        csr = getattr(self, kind)
+        lo, hi = self.min_amount, self.max_amount
+        offsets = array('I', [0])
+        neighbors, chans, edges = array('I'), array('I'), array('I')
+        for x in range(len(csr.offsets) - 1):
+            for i in range(csr.offsets[x], csr.offsets[x + 1]):
+                e = csr.edges[i]
+                if lo[e] <= amount_sat <= hi[e]:
+                    neighbors.append(csr.neighbors[i])
+                    chans.append(e >> 1)
+                    edges.append(e)
+            offsets.append(len(neighbors))
+        return CSRAdjacency(offsets, neighbors, chans, edges, order=csr.order)
+
+    def is_admissible(self, cid: int, from_node: int, amount_sat: int) -> bool:
+        e = (cid << 1) | (from_node != self.chan_u[cid])
+        return self.min_amount[e] <= amount_sat <= self.max_amount[e]
+
+    def endpoints(self, cid: int) -> Tuple[int, int]:
+        return self.chan_u[cid], self.chan_v[cid]
+
+    def amount_range(self, cid: int, from_node: int) -> Tuple[int, int]:
+        e = (cid << 1) | (from_node != self.chan_u[cid])
+        return self.min_amount[e], self.max_amount[e]
+
+    def _build_amount_breakpoints(self) -> List[int]:
+        points = set(self.min_amount)
+        points.update(hi + 1 for hi in self.max_amount)
+        return sorted(points)
+
+    def get_capacity(self, cid: int, from_node: int) -> int:
+        return self.capacity[(cid << 1) | (from_node != self.chan_u[cid])]
+
+    def get_total_capacity(self, cid: int) -> int:
+        return self.total_capacity[cid]
+
+    def get_htlc_min_msat(self, cid: int, from_node: int) -> int:
+        return self.htlc_min[(cid << 1) | (from_node != self.chan_u[cid])]
+
+    def get_htlc_max_msat(self, cid: int, from_node: int) -> int:
+        return self.htlc_max[(cid << 1) | (from_node != self.chan_u[cid])]
+
+    def get_base_fee_msat(self, cid: int, from_node: int, amount: int) -> int:
+        e = (cid << 1) | (from_node != self.chan_u[cid])
+        return self.base_fee[e] + (amount * self.fee_rate[e] / 1000)
+
+    def get_fee_rate(self, cid: int, from_node: int) -> int:
+        return self.fee_rate[(cid << 1) | (from_node != self.chan_u[cid])]
+
+    def get_delay(self, cid: int, from_node: int) -> int:
+        return self.delay[(cid << 1) | (from_node != self.chan_u[cid])]
+
+    def is_online(self, cid: int) -> bool:
+        return self.online[cid] == 1
+
+    def set_online(self, cid: int, online: bool) -> None:
+        self.online[cid] = 1 if online else 0
+
+    def is_bidirectional(self, cid: int) -> bool:
+        return bool(self.flags[cid] & 1)
+
+    def reduce_capacity(self, cid: int, from_node: int, amount: int) -> None:
+        e = (cid << 1) | (from_node != self.chan_u[cid])
+        self.capacity[e] = max(0, self.capacity[e] - amount)
+
+    def increase_capacity(self, cid: int, from_node: int, amount: int) -> None:
+        e = (cid << 1) | (from_node != self.chan_u[cid])
+        self.capacity[e] = max(0, self.capacity[e] + amount)
+
+    def saturate_channel(self, cid: int) -> None:
+        self.capacity[2 * cid] = self.total_capacity[cid]
+        self.capacity[2 * cid + 1] = 0
@@ -0,0 +1,112 @@
+import random
+import sys
+import time
+
+import config
+from bfs import AltSearch, RankGraph, compute_rank
+from bfs_route import shortest_path
+from landmarks import landmark_table
+from network import load_network
+from overlay import CapacityOverlay
+
+
+def _payments(net, count: int, seed: int = 88):
+    rng = random.Random(seed)
+    nodes = list(net.nodes)
+    out = []
+    for _ in range(count):
+        src, dst = rng.sample(nodes, 2)
+        out.append((src, dst, rng.randint(net.run_config.min_payment, net.run_config.max_payment)))
+    return out
+
+
+def _timed(fn, payments) -> float:
+    start = time.perf_counter()
+    for src, dst, amt in payments:
+        fn(src, dst, amt)
+    return (time.perf_counter() - start) / len(payments) * 1000.0
+
+
+def bench_rank_modes(net, count: int) -> None:
+    """
+    Per-payment cost of ranking in hop and fee mode, uncached.
+    """
+    graph = RankGraph(net)
+    payments = _payments(net, count)
+    hop = CapacityOverlay(net, net.run_config.replace(bfs_mode="hop"))
+    fee = CapacityOverlay(net, net.run_config.replace(bfs_mode="fee"))
+    landmarks = config.LANDMARKS
+    config.LANDMARKS = landmarks or 8
+    table = landmark_table(net)
+    config.LANDMARKS = landmarks
+    rows = [
+        ("hop, compute_rank (dict)", _timed(lambda s, d, a: compute_rank(hop, d, a), payments)),
+        ("hop, RankGraph.ranks", _timed(lambda s, d, a: graph.ranks(d, a), payments)),
+        (
+            f"hop, AltSearch ({table.k} landmarks, stop at src)",
+            _timed(lambda s, d, a: AltSearch(graph, graph.index[d], a, table).settle(graph.index[s]), payments),
+        ),
+        ("fee, compute_rank (dict, full)", _timed(lambda s, d, a: compute_rank(fee, d, a), payments)),
+        ("fee, compute_rank (dict, stop at src)", _timed(lambda s, d, a: compute_rank(fee, d, a, s), payments)),
+        ("fee, FeeSearch (full)", _timed(lambda s, d, a: graph.fee_search(d, a).settle(), payments)),
+        (
+            "fee, FeeSearch (stop at src)",
+            _timed(lambda s, d, a: graph.fee_search(d, a).settle(graph.index[s]), payments),
+        ),
+    ]
+
+    print("===== Rank cost per payment =====")
+    print(f"Snapshot: {config.SNAPSHOT_PATH} ({len(net.nodes)} nodes), backend: {config.NETWORK_BACKEND}")
+    for name, ms in rows:
+        print(f"{name:<44} {ms:8.3f} ms")
+
+
+def bench_bfs_route(net, count: int) -> None:
+    """
+    Per-payment path search of bfs_route, one-sided vs bidirectional vs
+    landmark A*: nodes expanded and latency, with adjacency views and the
+    landmark table already built.
+    """
+    searches = []
+    for src, dst, amt in _payments(net, count):
+        for v, cid in net.get_neighbors(src):
+            if net.get_capacity(cid, src) > amt:
+                searches.append((src, v, dst, amt))
+                break
+    for _, _, _, amt in searches:
+        net.admissible_adj(amt)
+        net.admissible_rev_adj(amt)
+    landmarks = config.LANDMARKS
+    config.LANDMARKS = landmarks or 8
+    landmark_table(net)
+
+    rows = []
+    lengths = {}
+    for search in ("forward", "bidirectional", "astar"):
+        expanded = 0
+        found = []
+        start = time.perf_counter()
+        for src, second, dst, amt in searches:
+            path, n = shortest_path(net, src, second, dst, amt, search)
+            expanded += n
+            found.append(None if path is None else len(path))
+        ms = (time.perf_counter() - start) / max(len(searches), 1) * 1000.0
+        rows.append((search, expanded / max(len(searches), 1), ms))
+        lengths[search] = found
+    config.LANDMARKS = landmarks
+
+    print("===== bfs_route path search per payment =====")
+    print(f"Snapshot: {config.SNAPSHOT_PATH} ({len(net.nodes)} nodes), backend: {config.NETWORK_BACKEND}")
+    print(f"Searches: {len(searches)}")
+    for name, nodes, ms in rows:
+        print(f"{name:<40} {nodes:10.1f} nodes {ms:8.3f} ms")
+    same = lengths["forward"] == lengths["bidirectional"] == lengths["astar"]
+    print(f"Same path lengths: {same}")
+
+
+if __name__ == "__main__":
+    # python benchmark.py [payments]
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    net = load_network(config.SNAPSHOT_PATH)
+    bench_rank_modes(net, count)
+    bench_bfs_route(net, count)
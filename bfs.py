@@ -1,39 +1,42 @@
 import heapq
 import math
-from collections import deque, defaultdict
+import weakref
+from array import array
+from collections import OrderedDict, deque, defaultdict
 from typing import Dict, List, Tuple
 
 import config
+from landmarks import FAR, LandmarkTable, landmark_table
 from network import Network
 
 
 def compute_rank(
     net: Network,
     dst: str,
-    amount_sat: int
+    amount_sat: int,
+    src: str = None
 ) -> Dict[str, float]:
     """
     Compute the "rank" (distance or cost) from each node to the destination.
     Uses reverse-BFS for hop-based routing or reverse-Dijkstra for fee-based routing,
     respecting directed channel capacity and HTLC bounds.
+    In fee mode the search stops once `src` is settled: nodes ranked below
+    src are exact, the rest hold upper bounds that are never below src's rank.
+    The mode is net.run_config.bfs_mode.
     """
+    if net.run_config.bfs_mode == "fee":
+        return _compute_fee_rank(net, dst, amount_sat, src)
+
     # Initialize ranks
-    rank: Dict[str, float] = {node: math.inf for node in sorted(net.nodes)}
+    rank: Dict[str, float] = dict.fromkeys(net.nodes, math.inf)
     rank[dst] = 0
 
+    rev = net.admissible_rev_adj(amount_sat)
     dq = deque([dst])
-    amt_msat = amount_sat * 1000
     while dq:
         cur = dq.popleft()
         dcur = rank[cur] + 1
-        for prev, cid in net.rev_adj.get(cur, []):
-           
-            chan = net.channels[cid]
-            if chan.total_capacity < amount_sat:
-                continue
-            if amt_msat < chan.get_htlc_min_msat(prev) or amt_msat > chan.get_htlc_max_msat(prev):
-                continue
-
+        for prev, cid in rev.get(cur, ()):
             # we can change the cost
             if dcur < rank[prev]:
                 rank[prev] = dcur
@@ -41,21 +44,555 @@ def compute_rank(
 
     return rank
 
+
+def _compute_fee_rank(net: Network, dst: str, amount_sat: int, src: str = None) -> Dict[str, float]:
+    rank: Dict[str, float] = dict.fromkeys(net.nodes, math.inf)
+    rank[dst] = 0
+    rev = net.admissible_rev_adj(amount_sat)
+    settled = set()
+    heap = [(0, dst)]
+    while heap:
+        d, cur = heapq.heappop(heap)
+        if cur in settled:
+            continue
+        settled.add(cur)
+        if cur == src:
+            break
+        for prev, cid in rev.get(cur, ()):
+            nd = d + net.get_base_fee_msat(cid, prev, amount_sat)
+            if nd < rank[prev]:
+                rank[prev] = nd
+                heapq.heappush(heap, (nd, prev))
+    return rank
+
+
+# rank of nodes that cannot reach the destination in the int-array form
+UNREACHABLE = 2 ** 31 - 1
+
+
+class RankGraph:
+    """
+    Reverse adjacency of a topology flattened into arrays for rank BFS.
+
+    Node slot i is the i-th node of sorted(net.nodes); `index` maps a node to
+    its slot (identity for ArrayNetwork). For slot x, entries
+    offsets[x]..offsets[x + 1] hold its predecessors' slots and the amount
+    range the predecessor->x direction admits, see Network.amount_range.
+    The fwd_* arrays are the same for outgoing channels, in get_neighbors order.
+    """
+
+    def __init__(self, net: Network):
+        self.nodes = sorted(net.nodes)
+        n = len(self.nodes)
+        if hasattr(net, 'node_ids'):
+            self.index = range(n)
+        else:
+            self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.offsets = array('I', [0])
+        self.preds = array('I')
+        self.lo = array('q')
+        self.hi = array('q')
+        # fee of the predecessor->x direction is base_fee + amount * fee_rate / 1000
+        self.base_fee = array('d')
+        self.fee_rate = array('q')
+        for node in self.nodes:
+            for u, cid in net.rev_adj.get(node, []):
+                lo, hi = net.amount_range(cid, u)
+                self.preds.append(self.index[u])
+                self.lo.append(lo)
+                self.hi.append(hi)
+                self.base_fee.append(net.get_base_fee_msat(cid, u, 0))
+                self.fee_rate.append(net.get_fee_rate(cid, u))
+            self.offsets.append(len(self.preds))
+        self.fwd_offsets = array('I', [0])
+        self.succs = array('I')
+        self.fwd_chans = []
+        self.fwd_lo = array('q')
+        self.fwd_hi = array('q')
+        for node in self.nodes:
+            for v, cid in net.get_neighbors(node):
+                lo, hi = net.amount_range(cid, node)
+                self.succs.append(self.index[v])
+                self.fwd_chans.append(cid)
+                self.fwd_lo.append(lo)
+                self.fwd_hi.append(hi)
+            self.fwd_offsets.append(len(self.succs))
+        self._unreached = array('i', [UNREACHABLE]) * n
+
+    def _admissible_preds(self, amount_sat: int) -> List[List[int]]:
+        off, preds, lo, hi = self.offsets, self.preds, self.lo, self.hi
+        return [
+            [preds[k] for k in range(off[x], off[x + 1]) if lo[k] <= amount_sat <= hi[k]]
+            for x in range(len(self.nodes))
+        ]
+
+    def ranks(self, dst, amount_sat: int) -> array:
+        """
+        Hop distance of every slot to `dst` over admissible channels.
+        """
+        off, preds, lo, hi = self.offsets, self.preds, self.lo, self.hi
+        dist = array('i', self._unreached)
+        start = self.index[dst]
+        dist[start] = 0
+        frontier = [start]
+        level = 0
+        while frontier:
+            level += 1
+            nxt = []
+            for x in frontier:
+                for k in range(off[x], off[x + 1]):
+                    if lo[k] <= amount_sat <= hi[k]:
+                        p = preds[k]
+                        if dist[p] == UNREACHABLE:
+                            dist[p] = level
+                            nxt.append(p)
+            frontier = nxt
+        return dist
+
+    def ranks_many(self, dsts: List, amount_sat: int) -> List[array]:
+        """
+        ranks() for several destinations sharing one amount class.
+
+        One level-synchronous BFS carries every destination as a bit of a
+        per-node mask, so each admissible edge is scanned once per level
+        instead of once per destination.
+        """
+        adj = self._admissible_preds(amount_sat)
+        rows = [array('i', self._unreached) for _ in dsts]
+        seen = [0] * len(self.nodes)
+        frontier: Dict[int, int] = {}
+        for j, dst in enumerate(dsts):
+            x = self.index[dst]
+            seen[x] |= 1 << j
+            frontier[x] = frontier.get(x, 0) | (1 << j)
+            rows[j][x] = 0
+        level = 0
+        while frontier:
+            level += 1
+            nxt: Dict[int, int] = {}
+            for x, mask in frontier.items():
+                for p in adj[x]:
+                    new = mask & ~seen[p]
+                    if new:
+                        seen[p] |= new
+                        nxt[p] = nxt.get(p, 0) | new
+            for p, mask in nxt.items():
+                while mask:
+                    low = mask & -mask
+                    rows[low.bit_length() - 1][p] = level
+                    mask ^= low
+            frontier = nxt
+        return rows
+
+    def fee_search(self, dst, amount_sat: int) -> "FeeSearch":
+        return FeeSearch(self, self.index[dst], amount_sat)
+
+
+class FeeSearch:
+    """
+    Resumable reverse Dijkstra over fees from one destination for one amount.
+
+    `dist` holds final costs for settled slots and upper bounds elsewhere.
+    settle(x) advances the search only until x is popped, so a later source
+    farther away resumes the same search instead of starting over.
+    """
+
+    def __init__(self, graph: RankGraph, start: int, amount_sat: int):
+        self.graph = graph
+        self.amount_sat = amount_sat
+        self.dist = array('d', [math.inf]) * len(graph.nodes)
+        self.dist[start] = 0
+        self.done = bytearray(len(graph.nodes))
+        self._heap = [(0, start)]
+
+    def settle(self, target: int = None) -> None:
+        g, a = self.graph, self.amount_sat
+        off, preds, lo, hi = g.offsets, g.preds, g.lo, g.hi
+        base_fee, fee_rate = g.base_fee, g.fee_rate
+        dist, done, heap = self.dist, self.done, self._heap
+        while heap:
+            if target is not None and done[target]:
+                return
+            d, x = heapq.heappop(heap)
+            if done[x]:
+                continue
+            done[x] = 1
+            for k in range(off[x], off[x + 1]):
+                if lo[k] <= a <= hi[k]:
+                    p = preds[k]
+                    nd = d + (base_fee[k] + (a * fee_rate[k] / 1000))
+                    if nd < dist[p]:
+                        dist[p] = nd
+                        heapq.heappush(heap, (nd, p))
+
+
+class AltSearch:
+    """
+    Resumable reverse A* over hops from one destination for one amount,
+    guided toward a source by landmark lower bounds (ALT).
+
+    `dist` holds exact hop ranks for settled slots and upper bounds (or
+    UNREACHABLE) elsewhere. settle(x) stops once every slot that can lie on
+    a shortest x -> dst walk is settled, which is all a strictly
+    rank-decreasing walk from x (CandidateDAG) reads. A later source re-keys
+    the open slots by its own bounds and resumes, so the settled part is
+    shared.
+    """
+
+    def __init__(self, graph: RankGraph, start: int, amount_sat: int, table: LandmarkTable):
+        self.graph = graph
+        self.amount_sat = amount_sat
+        self.table = table
+        self.dist = array('i', graph._unreached)
+        self.dist[start] = 0
+        self.done = bytearray(len(graph.nodes))
+        # open slots as (slot, dist) by f = dist + h, FAR when h rules the source out
+        self._buckets: Dict[int, List[Tuple[int, int]]] = {0: [(start, 0)]}
+        # settle(None) runs as a plain BFS until a source is given
+        self._target = None
+        self._h = lambda y: 0
+
+    def _retarget(self, target: int) -> None:
+        dist, done = self.dist, self.done
+        h = self.table.slot_bound_from(target) if target is not None else (lambda y: 0)
+        buckets: Dict[int, List[Tuple[int, int]]] = {}
+        for bucket in self._buckets.values():
+            for x, d in bucket:
+                if done[x] or d != dist[x]:
+                    continue
+                hx = h(x)
+                buckets.setdefault(FAR if hx == FAR else d + hx, []).append((x, d))
+        self._buckets = buckets
+        self._target = target
+        self._h = h
+
+    def settle(self, target: int = None) -> None:
+        """
+        Settle every slot that can lie on a shortest target -> dst walk, or
+        every reachable slot when `target` is None.
+        """
+        if target != self._target:
+            self._retarget(target)
+        g, a, h = self.graph, self.amount_sat, self._h
+        off, preds, lo, hi = g.offsets, g.preds, g.lo, g.hi
+        dist, done, buckets = self.dist, self.done, self._buckets
+        while buckets:
+            f = min(buckets)
+            if target is not None and (f >= FAR or (done[target] and f > dist[target])):
+                return
+            bucket = buckets.pop(f)
+            i = 0
+            # the bucket grows while it is scanned: equal-f predecessors land here
+            while i < len(bucket):
+                x, d = bucket[i]
+                i += 1
+                if done[x] or d != dist[x]:
+                    continue
+                done[x] = 1
+                nd = d + 1
+                for k in range(off[x], off[x + 1]):
+                    if lo[k] <= a <= hi[k]:
+                        p = preds[k]
+                        if nd < dist[p]:
+                            dist[p] = nd
+                            hp = h(p)
+                            key = FAR if hp == FAR else nd + hp
+                            if key == f:
+                                bucket.append((p, nd))
+                            else:
+                                buckets.setdefault(key, []).append((p, nd))
+
+
+class CandidateDAG:
+    """
+    Candidate channels of nodes toward one destination for one amount class,
+    as produced node by node by candidate_channels.
+
+    A node is expanded the first time a walk reaches it and kept: its strictly
+    closer admissible neighbors in get_neighbors order (the walk order) and
+    the up to MAX_CANDIDATES of them with the lowest rank, as the (node,
+    channel) list handed out in F. Later sources only re-walk the kept entries.
+    With an AltSearch behind `rank`, each walk first settles it up to its source.
+    """
+
+    def __init__(self, graph: RankGraph, rank: array, amount_sat: int, k: int, search: AltSearch = None):
+        self.graph = graph
+        self.rank = rank
+        self.amount_sat = amount_sat
+        self.k = k
+        self.search = search
+        self._succs: Dict[int, Tuple[int, ...]] = {}
+        self._cands: Dict[int, List[Tuple[str, str]]] = {}
+
+    def _expand(self, u: int) -> None:
+        g, rank, a = self.graph, self.rank, self.amount_sat
+        succs, chans, lo, hi = g.succs, g.fwd_chans, g.fwd_lo, g.fwd_hi
+        r_u = rank[u]
+        strict = [
+            (succs[i], chans[i])
+            for i in range(g.fwd_offsets[u], g.fwd_offsets[u + 1])
+            if lo[i] <= a <= hi[i] and rank[succs[i]] < r_u
+        ]
+        nodes = g.nodes
+        self._succs[u] = tuple(v for v, _ in strict)
+        self._cands[u] = [(nodes[v], cid) for v, cid in heapq.nsmallest(self.k, strict, key=lambda x: rank[x[0]])]
+
+    def slice(self, src, dst) -> Dict[str, List[Tuple[str, str]]]:
+        """
+        candidate_channels(net, rank, amount, src, dst) read from the DAG: the
+        same breadth-first walk from src, stopping at dst. The lists in F are
+        shared with the DAG and must not be mutated.
+        """
+        nodes = self.graph.nodes
+        start, stop = self.graph.index[src], self.graph.index[dst]
+        if self.search is not None:
+            self.search.settle(start)
+        succs, cands = self._succs, self._cands
+        F: Dict[str, List[Tuple[str, str]]] = {}
+        q = deque([start])
+        seen = set()
+        while q:
+            u = q.popleft()
+            if u in seen:
+                continue
+            seen.add(u)
+            if u == stop:
+                F[nodes[u]] = []
+                break
+            if u not in succs:
+                self._expand(u)
+            q.extend(succs[u])
+            F[nodes[u]] = cands[u]
+        return F
+
+
+class _LRUCache:
+    """
+    OrderedDict LRU with hit/miss/eviction counters; max_entries <= 0 disables storing.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        else:
+            self.misses += 1
+        return value
+
+    def _store(self, key, value) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def counters(self) -> '_LRUCache':
+        """
+        A detached copy holding only the counters and entry keys, cheap to
+        send back from a worker process for metrics.report_cache.
+        """
+        copy = _LRUCache(self.max_entries)
+        copy._entries = OrderedDict.fromkeys(self._entries)
+        copy.hits, copy.misses, copy.evictions = self.hits, self.misses, self.evictions
+        return copy
+
+
+class RankCache(_LRUCache):
+    """
+    Size-bounded LRU of rank arrays (see RankGraph).
+
+    Rank only reads channel sizes and HTLC bounds, which never change during a
+    simulation, so it is keyed by (dst, amount class) rather than the exact
+    amount: every amount in a class admits the same channels and gets the
+    same rank. Cached arrays are shared between callers and must not be mutated.
+
+    With BFS_MODE = "fee" edge costs depend on the exact amount, so entries
+    are resumable FeeSearches keyed by (dst, "fee", amount); a lookup is a hit
+    when the source is already settled.
+
+    With config.RANK_PRUNING and a landmark table (config.LANDMARKS), hop
+    ranks asked for with a source are AltSearches keyed by (dst, "alt",
+    amount class), settled only as far as the sources seen so far need.
+    """
+
+    def __init__(self, net: Network, max_entries: int = None):
+        super().__init__(config.RANK_CACHE_SIZE if max_entries is None else max_entries)
+        self.net = net
+        self.graph = RankGraph(net)
+
+    def get(self, dst: str, amount_sat: int, src: str = None, mode: str = None) -> array:
+        # the cache is shared by every scenario on the topology, so callers
+        # pass their own mode (default: the topology's run config)
+        if (mode or self.net.run_config.bfs_mode) == "fee":
+            return self._get_fee(dst, amount_sat, src)
+        if src is not None:
+            search = self.alt_search(dst, amount_sat)
+            if search is not None:
+                search.settle(self.graph.index[src])
+                return search.dist
+        key = (dst, self.net.amount_class(amount_sat))
+        rank = self._lookup(key)
+        if rank is not None:
+            return rank
+        rank = self.graph.ranks(dst, amount_sat)
+        self._store(key, rank)
+        return rank
+
+    def _get_fee(self, dst: str, amount_sat: int, src: str = None) -> array:
+        key = (dst, "fee", amount_sat)
+        search = self._entries.get(key)
+        if search is None:
+            search = self.graph.fee_search(dst, amount_sat)
+            self._store(key, search)
+        else:
+            self._entries.move_to_end(key)
+        target = None if src is None else self.graph.index[src]
+        if target is not None and search.done[target]:
+            self.hits += 1
+        else:
+            self.misses += 1
+            search.settle(target)
+        return search.dist
+
+    def alt_search(self, dst: str, amount_sat: int) -> AltSearch:
+        """
+        The pruned hop search toward `dst` for the amount's class, or None
+        without config.RANK_PRUNING or a landmark table.
+        """
+        table = landmark_table(self.net) if config.RANK_PRUNING else None
+        if table is None:
+            return None
+        key = (dst, "alt", self.net.amount_class(amount_sat))
+        search = self._lookup(key)
+        if search is None:
+            search = AltSearch(self.graph, self.graph.index[dst], amount_sat, table)
+            self._store(key, search)
+        return search
+
+    def prefetch(self, payments, mode: str = None) -> None:
+        """
+        Compute the ranks a block of (src, dst, amount) payments will ask for,
+        grouped by amount class so each group is one ranks_many() pass.
+        Pruned hop ranks are settled per source instead.
+        """
+        if (mode or self.net.run_config.bfs_mode) == "fee":
+            for src, dst, amount in payments:
+                self._get_fee(dst, amount, src)
+            return
+        if config.RANK_PRUNING and landmark_table(self.net) is not None:
+            for src, dst, amount in payments:
+                self.get(dst, amount, src)
+            return
+        by_class: Dict[int, Tuple[int, List[str]]] = {}
+        for _, dst, amount in payments:
+            cls = self.net.amount_class(amount)
+            if (dst, cls) in self._entries:
+                # keep it past the stores below, the block is about to use it
+                self._entries.move_to_end((dst, cls))
+                continue
+            amount_sat, dsts = by_class.setdefault(cls, (amount, []))
+            if dst not in dsts:
+                dsts.append(dst)
+        chunk = max(self.max_entries, 1)
+        for cls, (amount_sat, dsts) in by_class.items():
+            for i in range(0, len(dsts), chunk):
+                block = dsts[i:i + chunk]
+                for dst, rank in zip(block, self.graph.ranks_many(block, amount_sat)):
+                    self._store((dst, cls), rank)
+
+
+class CandidateCache(_LRUCache):
+    """
+    Size-bounded LRU of CandidateDAGs keyed by (dst, amount class, candidate
+    limit), so every source paying the same destination in the same class
+    reuses one DAG.
+    Hop mode only: fee ranks depend on the exact amount and on how far the
+    search toward each source was taken.
+    """
+
+    def __init__(self, net: Network, ranks: RankCache, max_entries: int = None):
+        super().__init__(config.CANDIDATE_CACHE_SIZE if max_entries is None else max_entries)
+        self.net = net
+        self.ranks = ranks
+
+    def get(self, src: str, dst: str, amount_sat: int, max_candidates: int = None) -> Dict[str, List[Tuple[str, str]]]:
+        if max_candidates is None:
+            max_candidates = self.net.run_config.max_candidates
+        key = (dst, self.net.amount_class(amount_sat), max_candidates)
+        dag = self._lookup(key)
+        if dag is None:
+            search = self.ranks.alt_search(dst, amount_sat)
+            rank = search.dist if search is not None else self.ranks.get(dst, amount_sat, mode="hop")
+            dag = CandidateDAG(self.ranks.graph, rank, amount_sat, max_candidates, search)
+            self._store(key, dag)
+        return dag.slice(src, dst)
+
+
+# one cache per loaded topology, shared by every overlay stacked on it
+_rank_caches: "weakref.WeakKeyDictionary[Network, RankCache]" = weakref.WeakKeyDictionary()
+
+_candidate_caches: "weakref.WeakKeyDictionary[Network, CandidateCache]" = weakref.WeakKeyDictionary()
+
+
+def rank_cache(net: Network) -> RankCache:
+    """
+    The RankCache of the topology under `net` (overlays share their root's).
+    """
+    root = getattr(net, '_root', net)
+    cache = _rank_caches.get(root)
+    if cache is None:
+        cache = _rank_caches[root] = RankCache(root)
+    return cache
+
+
+def candidate_cache(net: Network) -> CandidateCache:
+    root = getattr(net, '_root', net)
+    cache = _candidate_caches.get(root)
+    if cache is None:
+        cache = _candidate_caches[root] = CandidateCache(root, rank_cache(root))
+    return cache
+
+
+def candidates(net: Network, src: str, dst: str, amount_sat: int) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Candidate channels for one payment (see candidate_channels), through the
+    caches, with the mode and limit of net.run_config.
+    """
+    run_config = net.run_config
+    if run_config.bfs_mode == "fee":
+        return candidate_channels(net, rank_cache(net).get(dst, amount_sat, src, "fee"), amount_sat, src, dst)
+    return candidate_cache(net).get(src, dst, amount_sat, run_config.max_candidates)
+
+
 def forward_reachable(net, rank, src, amount_sat):
+    adj = net.admissible_adj(amount_sat)
     seen = {src}
-    amt_msat = amount_sat * 1000
     q = deque([src])
     while q:
         u = q.popleft()
         if u in seen:
             continue
-        for v, cid in net.get_neighbors(u):
-            chan = net.channels[cid]
-            if chan.total_capacity < amount_sat:
-                continue
-            if amt_msat < chan.get_htlc_min_msat(u) or amt_msat > chan.get_htlc_max_msat(u):
-                continue
-
+        for v, cid in adj.get(u, ()):
             if u not in seen:
                 seen.add(v)
                 q.append(v)
@@ -63,19 +600,21 @@ def forward_reachable(net, rank, src, amount_sat):
 
 def candidate_channels(
     net: Network,
-    rank: Dict[str, float],
+    rank: array,
     amount_sat: int,
     src: str,
     dst: str,
 ) -> Dict[str, List[str]]:
     """
     For each node, select up to K outgoing channels that reach dst without loops.
+    `rank` is a RankCache array, indexed by the node's RankGraph slot.
     1) Gather strict-closer hops (rank[v] < rank[u]).
     3) Sort selection by rank(v) ascending and truncate to K.
     """
     F: Dict[str, List[str]] = {}
-    amt_msat = amount_sat * 1000
-    K = config.MAX_CANDIDATES
+    K = net.run_config.max_candidates
+    pos = rank_cache(net).graph.index
+    adj = net.admissible_adj(amount_sat)
 
     q = list()
     q.append(src)
@@ -89,19 +628,13 @@ def candidate_channels(
         if u == dst:
             F[u] = []
             break
-        for v, cid in net.get_neighbors(u):
-            chan = net.channels[cid]
-            if chan.total_capacity < amount_sat:
-                continue
-            if amt_msat < chan.get_htlc_min_msat(u) or amt_msat > chan.get_htlc_max_msat(u):
-                continue
-            r_u = rank.get(u, math.inf)
-            r_v = rank.get(v, math.inf)
-            if r_v < r_u:
+        r_u = rank[pos[u]]
+        for v, cid in adj.get(u, ()):
+            if rank[pos[v]] < r_u:
                 strict.append((v, cid))
                 q.append(v)
 
-        chosen = heapq.nsmallest(K, strict, key=lambda x: rank[x[0]])
+        chosen = heapq.nsmallest(K, strict, key=lambda x: rank[pos[x[0]]])
 
         F[u] = chosen
 
@@ -1,9 +1,173 @@
 from collections import deque
-from typing import List
+from typing import Dict, List, Optional, Tuple
+import math
+from landmarks import FAR, landmark_table
 from tools import commit_capacity
 from network import Network
 
 
+def _unwind(prev: Dict, dst: str) -> List[Tuple[str, str, str]]:
+    path = []
+    cur = dst
+    while prev[cur] is not None:
+        pu, cid = prev[cur]
+        path.append((pu, cur, cid))
+        cur = pu
+    path.reverse()
+    return path
+
+
+def _search_forward(adj, src: str, start: str, dst: str) -> Tuple[Optional[List[Tuple[str, str, str]]], int]:
+    # one-sided BFS from start until dst is dequeued
+    queue = deque([start])
+    visited = {src, start}
+    # to reconstruct: prev[node] = (prev_node, channel_id)
+    prev = {start: None}
+    expanded = 0
+    while queue:
+        u = queue.popleft()
+        if u == dst:
+            return _unwind(prev, dst), expanded
+        expanded += 1
+        for v, cid in adj.get(u, ()):
+            if v in visited:
+                continue
+            prev[v] = (u, cid)
+            queue.append(v)
+            visited.add(v)
+    return None, expanded
+
+
+def _search_astar(adj, src: str, start: str, dst: str, h) -> Tuple[Optional[List[Tuple[str, str, str]]], int]:
+    """
+    A* from start with unit hop costs and a consistent lower bound h(u) on
+    the hops u -> dst, using one bucket per f = g + h. Nodes with h = FAR
+    cannot reach dst and are never queued.
+    """
+    f = h(start)
+    if f == FAR:
+        return None, 0
+    dist = {start: 0}
+    prev = {start: None}
+    done = {src}
+    buckets = {f: [start]}
+    expanded = 0
+    while buckets:
+        bucket = buckets.pop(f, None)
+        if bucket is None:
+            f += 1
+            continue
+        # h is consistent, so a node pushed from bucket f lands in f or later
+        i = 0
+        while i < len(bucket):
+            u = bucket[i]
+            i += 1
+            if u in done:
+                continue
+            if u == dst:
+                return _unwind(prev, dst), expanded
+            done.add(u)
+            expanded += 1
+            d = dist[u] + 1
+            for v, cid in adj.get(u, ()):
+                if v in done or d >= dist.get(v, math.inf):
+                    continue
+                hv = h(v)
+                if hv == FAR:
+                    continue
+                dist[v] = d
+                prev[v] = (u, cid)
+                fv = d + hv
+                if fv == f:
+                    bucket.append(v)
+                else:
+                    buckets.setdefault(fv, []).append(v)
+        f += 1
+    return None, expanded
+
+
+def _join(fwd: Dict, bwd: Dict, meet: str) -> List[Tuple[str, str, str]]:
+    path = []
+    cur = meet
+    while fwd[cur] is not None:
+        u, cid = fwd[cur]
+        path.append((u, cur, cid))
+        cur = u
+    path.reverse()
+    cur = meet
+    while bwd[cur] is not None:
+        v, cid = bwd[cur]
+        path.append((cur, v, cid))
+        cur = v
+    return path
+
+
+def _search_bidirectional(adj, rev, src: str, start: str, dst: str) -> Tuple[Optional[List[Tuple[str, str, str]]], int]:
+    """
+    Level-synchronous BFS from start over `adj` and from dst over `rev`,
+    always growing the smaller frontier. Neither side enters src. The first
+    node both sides reach lies on a shortest start->dst path: before that
+    level the two balls were disjoint, so no path is shorter.
+    """
+    if start == dst:
+        return [], 0
+    fwd = {start: None}    # node -> (prev_node, channel_id)
+    bwd = {dst: None}      # node -> (next_node, channel_id)
+    f_frontier, b_frontier = [start], [dst]
+    expanded = 0
+    while f_frontier and b_frontier:
+        nxt = []
+        if len(f_frontier) <= len(b_frontier):
+            for u in f_frontier:
+                expanded += 1
+                for v, cid in adj.get(u, ()):
+                    if v == src or v in fwd:
+                        continue
+                    fwd[v] = (u, cid)
+                    if v in bwd:
+                        return _join(fwd, bwd, v), expanded
+                    nxt.append(v)
+            f_frontier = nxt
+        else:
+            for v in b_frontier:
+                expanded += 1
+                for u, cid in rev.get(v, ()):
+                    if u == src or u in bwd:
+                        continue
+                    bwd[u] = (v, cid)
+                    if u in fwd:
+                        return _join(fwd, bwd, u), expanded
+                    nxt.append(u)
+            b_frontier = nxt
+    return None, expanded
+
+
+def shortest_path(
+    net: Network,
+    src: str,
+    start: str,
+    dst: str,
+    amount_sat: int,
+    search: str = None
+) -> Tuple[Optional[List[Tuple[str, str, str]]], int]:
+    """
+    Fewest-hop start->dst path over channels admissible for `amount_sat`,
+    never passing through src, as (u, v, channel_id) hops (None if there is
+    none), plus the number of nodes the search expanded.
+    `search` is "forward", "bidirectional" or "astar" (default: the
+    bfs_route_search of net.run_config).
+    """
+    adj = net.admissible_adj(amount_sat)
+    search = search or net.run_config.bfs_route_search
+    if search == "forward":
+        return _search_forward(adj, src, start, dst)
+    if search == "astar":
+        table = landmark_table(net)
+        h = table.bound_to(dst) if table is not None else (lambda u: 0)
+        return _search_astar(adj, src, start, dst, h)
+    return _search_bidirectional(adj, net.admissible_rev_adj(amount_sat), src, start, dst)
+
+
 def bfs_route(
     net: Network,
     src: str,
@@ -14,70 +178,32 @@ def bfs_route(
     Return the shortest path as a list of (u, v, channel_id) triples,
     or None if no capacity‐compatible path exists.
     """
-    # BFS queue and visitation
-
     second, cid = None, None
     for v, c in net.get_neighbors(src):
-        channel = net.channels[c]
-        if channel.get_capacity(src) > amount_sat:
+        if net.get_capacity(c, src) > amount_sat:
             second = v
             cid = c
             break
 
-    queue = deque([second])
-    visited = set()
-    visited.add(src)
-    # to reconstruct: prev[node] = (prev_node, channel_id)
-
     hops = 0
     cltv_delay = 0
     base_fees = 0
-    prev = {}
-    prev[second] = (src, cid)
+    if second is None:
+        return False, hops, cltv_delay, base_fees
 
-    while queue:
-        u = queue.popleft()
-        visited.add(u)
-        if u == dst:
-            # reconstruct path
-            path = []
-            cur = dst
-            while cur != src:
-                pu, cid = prev[cur]
-                path.append((pu, cur, cid))
-                cur = pu
-            path.reverse()
-
-            cpath = [src]
-            
-            for u, v, cid in path:
-                channel = net.channels[cid]
-                hops += 1
-                cltv_delay += channel.get_delay(u)
-                base_fees += channel.get_base_fee_msat(u, amount_sat)
-                cpath.append(v)
-                if channel.get_capacity(u) < amount_sat or not channel.online:
-                    return False, hops, cltv_delay, base_fees
-
-            commit_capacity(net, cpath, amount_sat)
-            
-            return True, hops, cltv_delay, base_fees
-
-        for v, cid in net.get_neighbors(u):
-            if v in visited:
-                continue
-            chan = net.channels[cid]
+    rest, _ = shortest_path(net, src, second, dst, amount_sat)
+    if rest is None:
+        # no path found
+        return False, hops, cltv_delay, base_fees
 
-            if chan.total_capacity < amount_sat:
-                continue
+    path = [(src, second, cid)] + rest
+    for u, v, cid in path:
+        hops += 1
+        cltv_delay += net.get_delay(cid, u)
+        base_fees += net.get_base_fee_msat(cid, u, amount_sat)
+        if net.get_capacity(cid, u) < amount_sat or not net.is_online(cid):
+            return False, hops, cltv_delay, base_fees
 
-            msat = amount_sat * 1_000
-            if msat < chan.get_htlc_min_msat(u) or msat > chan.get_htlc_max_msat(u):
-                continue
-
-            prev[v] = (u, cid)
-            queue.append(v)
-            visited.add(v)
+    commit_capacity(net, path, amount_sat)
 
-    # no path found
-    return False, hops, cltv_delay, base_fees
+    return True, hops, cltv_delay, base_fees
@@ -1,18 +1,53 @@
+# Scenario settings below are read through run_config.RunConfig, taken from
+# these values when a network is loaded (or given explicitly to simulator.run)
 # path to a real‐world Lightning snapshot (e.g. CSV or JSON)
 # SNAPSHOT_PATH = "./other/listchannels20220412.json"
 SNAPSHOT_PATH = "snapshot/listchannels20220412-real.json"
+# load through the compiled binary form (<snapshot>.bin), rebuilt when the JSON changes
+SNAPSHOT_CACHE = True
+# where compiled snapshots are written; None keeps them next to the JSON file
+SNAPSHOT_CACHE_DIR = None
+# "objects" keeps one Channel object per channel; "arrays" interns nodes to ints
+# and stores channel fields in columns (always loads through the compiled snapshot)
+NETWORK_BACKEND = "objects"
 
 # ───────── BFS ──────────────────────────────────────────
 # choose "hop" or "fee" for your two versions
 BFS_MODE = "hop"       # or "fee"
-# if fee mode, we ignore real fees and assign random weights in [1, MAX_WEIGHT]
+# fee mode ranks nodes by the cheapest total channel fee (base + proportional) to dst
+# rank results kept per (destination, amount class); 0 disables the cache
+RANK_CACHE_SIZE = 512
+# admissible adjacency views kept per (direction, amount class)
+ADJ_VIEW_CACHE_SIZE = 16
+# candidate-channel DAGs kept per (destination, amount class); 0 disables the cache
+CANDIDATE_CACHE_SIZE = 128
+
+
+# source routing path search: "bidirectional" (meet in the middle), "forward" (one-sided BFS)
+# or "astar" (goal-directed by the landmark table below, plain best-first without it)
+BFS_ROUTE_SEARCH = "bidirectional"
+# high-degree landmarks in the ALT hop-distance table (see landmarks.py); 0 disables it.
+# Read by the "astar" search above and by RANK_PRUNING
+LANDMARKS = 0
+# with a landmark table, hop ranks only settle nodes that can lie on a shortest
+# src->dst walk (bfs.AltSearch) instead of the whole graph; same candidates either way
+RANK_PRUNING = False
 
 
 # ───────── Bloom Filter ──────────────────────────────────
 # false‑positive rate you’re willing to tolerate
 BF_FALSE_POS_RATE = 0.0000001
-# number of items you expect to insert per filter
-BF_EXPECTED_ITEMS = 100000
+# number of items you expect to insert per filter; None sizes each ticket to its edge count
+BF_EXPECTED_ITEMS = None
+# ticket encoding: "bloom", "blocked" (blocked Bloom), "xor", "gcs" (Golomb-coded set)
+# or "auto" (fewest bytes for the payment's candidate count)
+TICKET_ENCODING = "bloom"
+# "auto" skips GCS above this many edges, since every hop has to decode it
+TICKET_GCS_MAX_ITEMS = 256
+# also send a reject ticket holding the edges the primary lets through without being candidates
+REJECT_TICKET = False
+# starting false-positive rate of the reject ticket (lowered until it misses every candidate)
+REJECT_FALSE_POS_RATE = 0.01
 # fallback strategy: "retry" or "alternative_path"
 
 # ───────── Splitting ────────────────────────────────────
@@ -33,6 +68,29 @@ MAX_CANDIDATES = 3000
 NUM_ATTEMPTS = 1
 
 NUM_TREES = 1  # or however many trees you want to use
+# processes building the NUM_TREES trees in set_routes; 1 builds them in-process
+SETUP_WORKERS = 1
+# what a payment candidate must have a usable path in: "live" = every algorithm's
+# current balances, "scenario" = the scenario before any payment (needed for
+# SIM_WORKERS > 1; the payment list then does not depend on the routers)
+FEASIBILITY_MODE = "live"
+# processes running the routing algorithms; 1 interleaves them payment by payment.
+# Above 1 each algorithm replays the vetted payment list in its own process
+SIM_WORKERS = 1
+# with SIM_WORKERS > 1, also simulate the serial run and check the results match
+SIM_VERIFY = False
+# sweep.py: points simulated at a time (None = one per CPU) and where results are kept
+# (results/plot.py reads them from there)
+SWEEP_WORKERS = None
+SWEEP_STORE = "results/sweep.json"
+# replay payment candidates from a trace written by workload.py instead of sampling them
+TRACE_PATH = None
+# workload.py distributions: Zipf exponent of "zipf" endpoints, tail index of "pareto" amounts
+TRACE_ZIPF_EXPONENT = 1.0
+TRACE_PARETO_ALPHA = 1.16
+# re-stabilize the trees when a payment drains or refills a channel direction,
+# instead of keeping the set_routes embedding for the whole run
+DYNAMIC_EMBEDDING = False
 SPLIT_COUNT = 1
 SATURATION_PORTION = 0
 
@@ -0,0 +1,188 @@
+from array import array
+from typing import Dict, List
+
+
+class TreeEmbedding:
+    """
+    One SpeedyMurmurs spanning tree over node slots (see Network.node_slots).
+
+    A node's coordinate is its root path, held implicitly as `parent` and
+    `depth` (-1 for nodes not in the tree). The tree distance between two
+    nodes is depth(a) + depth(b) - 2 * depth(lca), which is what comparing
+    the explicit coordinate lists prefix by prefix used to compute. Nodes not
+    in the tree have the empty coordinate, like the root, so they count as
+    the root.
+
+    The LCA depth comes from an Euler tour with a sparse table of range
+    minima over tour depths, so distance() is O(1). After the tree changes,
+    queries climb parent pointers (O(depth)) until enough of them have been
+    asked to pay for rebuilding the index.
+    """
+
+    def __init__(self, nodes: List, index, root):
+        self.nodes = nodes
+        self.index = index
+        n = len(index)
+        self.parent = array('i', [-1]) * n
+        self.depth = array('i', [-1]) * n
+        self.root = index[root]
+        self.depth[self.root] = 0
+        self._children = None  # slot -> child slots, built for the first subtree reset
+        self._first = None     # slot -> position of its first visit in the tour
+        self._table = None     # table[j][i] = min tour depth over [i, i + 2**j)
+        self._stale_queries = 0
+
+    @classmethod
+    def from_arrays(cls, nodes: List, index, root: int, parent: array, depth: array) -> 'TreeEmbedding':
+        """
+        Wrap slot arrays built elsewhere (see speedy_setup.build_tree); `root` is a slot.
+        """
+        tree = cls.__new__(cls)
+        tree.nodes = nodes
+        tree.index = index
+        tree.parent = parent
+        tree.depth = depth
+        tree.root = root
+        tree._children = None
+        tree._first = None
+        tree._table = None
+        tree._stale_queries = 0
+        return tree
+
+    def __contains__(self, node) -> bool:
+        return self.depth[self.index[node]] >= 0
+
+    def depth_of(self, node) -> int:
+        return self.depth[self.index[node]]
+
+    def parent_of(self, node):
+        p = self.parent[self.index[node]]
+        return self.nodes[p] if p >= 0 else None
+
+    def _changed(self) -> None:
+        self._table = None
+        self._stale_queries = 0
+
+    def _child_lists(self) -> Dict[int, List[int]]:
+        if self._children is None:
+            children: Dict[int, List[int]] = {}
+            for x, p in enumerate(self.parent):
+                if p >= 0:
+                    children.setdefault(p, []).append(x)
+            self._children = children
+        return self._children
+
+    def attach(self, node, parent) -> None:
+        """
+        Make `node` a child of `parent`, which must already be in the tree.
+        """
+        x, p = self.index[node], self.index[parent]
+        if self._children is not None:
+            old = self.parent[x]
+            if old >= 0:
+                self._children[old].remove(x)
+            self._children.setdefault(p, []).append(x)
+        self.parent[x] = p
+        self.depth[x] = self.depth[p] + 1
+        self._changed()
+
+    def detach_subtree(self, node) -> List:
+        """
+        Take `node` and all its descendants out of the tree; returns them,
+        `node` first. Walks the child lists, so it costs O(subtree).
+        """
+        children = self._child_lists()
+        x = self.index[node]
+        p = self.parent[x]
+        if p >= 0:
+            children[p].remove(x)
+        parent, depth = self.parent, self.depth
+        out = []
+        stack = [x]
+        while stack:
+            y = stack.pop()
+            out.append(self.nodes[y])
+            stack.extend(children.pop(y, ()))
+            parent[y] = -1
+            depth[y] = -1
+        self._changed()
+        return out
+
+    def _build_index(self) -> None:
+        parent, depth = self.parent, self.depth
+        n = len(parent)
+        # children in slot order, as a CSR pair
+        counts = array('i', [0]) * (n + 1)
+        for x in range(n):
+            if parent[x] >= 0:
+                counts[parent[x] + 1] += 1
+        for x in range(n):
+            counts[x + 1] += counts[x]
+        children = array('i', [0]) * counts[n]
+        fill = array('i', counts[:n])
+        for x in range(n):
+            p = parent[x]
+            if p >= 0:
+                children[fill[p]] = x
+                fill[p] += 1
+
+        first = array('i', [-1]) * n
+        tour = array('i')
+        # iterative DFS: (slot, next child offset)
+        stack = [(self.root, counts[self.root])]
+        first[self.root] = 0
+        tour.append(0)
+        while stack:
+            x, k = stack[-1]
+            if k < counts[x + 1]:
+                stack[-1] = (x, k + 1)
+                c = children[k]
+                first[c] = len(tour)
+                tour.append(depth[c])
+                stack.append((c, counts[c]))
+            else:
+                stack.pop()
+                if stack:
+                    tour.append(depth[stack[-1][0]])
+
+        table: List[array] = [tour]
+        span = 1
+        while 2 * span <= len(tour):
+            prev = table[-1]
+            table.append(array('i', map(min, prev[:len(prev) - span], prev[span:])))
+            span *= 2
+        self._first = first
+        self._table = table
+
+    def distance(self, a, b) -> int:
+        x, y = self.index[a], self.index[b]
+        depth = self.depth
+        dx, dy = depth[x], depth[y]
+        # nodes outside the tree count as the root
+        if dx < 0:
+            x, dx = self.root, 0
+        if dy < 0:
+            y, dy = self.root, 0
+        if self._table is None:
+            self._stale_queries += 1
+            if self._stale_queries * 8 < len(depth):
+                return dx + dy - 2 * self._climb_lca_depth(x, y)
+            self._build_index()
+        first = self._first
+        l, r = first[x], first[y]
+        if l > r:
+            l, r = r, l
+        j = (r - l + 1).bit_length() - 1
+        row = self._table[j]
+        lca = min(row[l], row[r - (1 << j) + 1])
+        return dx + dy - 2 * lca
+
+    def _climb_lca_depth(self, x: int, y: int) -> int:
+        parent, depth = self.parent, self.depth
+        while depth[x] > depth[y]:
+            x = parent[x]
+        while depth[y] > depth[x]:
+            y = parent[y]
+        while x != y:
+            x, y = parent[x], parent[y]
+        return depth[x]
@@ -0,0 +1,135 @@
+import random
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from run_config import RunConfig
+
+
+def path_exists(net, src: str, dst: str, amount_sat: int) -> Tuple[bool, int]:
+    """
+    Whether `net` has an online src->dst path with `amount_sat` capacity on
+    every hop, as tools.is_there_really_a_path decides it, plus the number of
+    nodes expanded. Searches from both ends, growing the smaller frontier,
+    and stops as soon as the two sides touch.
+    """
+    if src == dst:
+        return True, 0
+    adj = net.admissible_adj(amount_sat)
+    rev = net.admissible_rev_adj(amount_sat)
+    fwd, bwd = {src}, {dst}
+    f_frontier, b_frontier = [src], [dst]
+    expanded = 0
+    while f_frontier and b_frontier:
+        nxt = []
+        if len(f_frontier) <= len(b_frontier):
+            for u in f_frontier:
+                expanded += 1
+                for v, cid in adj.get(u, ()):
+                    if v in fwd or not net.is_online(cid) or net.get_capacity(cid, u) < amount_sat:
+                        continue
+                    if v in bwd:
+                        return True, expanded
+                    fwd.add(v)
+                    nxt.append(v)
+            f_frontier = nxt
+        else:
+            for v in b_frontier:
+                expanded += 1
+                for u, cid in rev.get(v, ()):
+                    if u in bwd or not net.is_online(cid) or net.get_capacity(cid, u) < amount_sat:
+                        continue
+                    if u in fwd:
+                        return True, expanded
+                    bwd.add(u)
+                    nxt.append(u)
+            b_frontier = nxt
+    return False, expanded
+
+
+class FeasibilityOracle:
+    """
+    Draws the simulator's payments and vets them.
+
+    A candidate (src, dst, amount) is accepted when src != dst, neither end
+    is blacklisted, and every network in `nets` has a usable src->dst path
+    (path_exists). Candidates come from `candidates` (e.g. a replayed
+    workload trace, extra fields after the amount are ignored) or else from
+    the oracle's own RNG, so routing randomness does not shift them. Each is
+    vetted against the networks' state at the moment it is drawn: in live
+    mode every accepted payment changes that state, so a verdict on a later
+    candidate could not be reused. Amount bounds come from `run_config`
+    (default: that of the first network).
+    """
+
+    def __init__(
+        self,
+        nets: List,
+        nodes: Iterable,
+        blacklist: Iterable,
+        seed: int,
+        candidates: Iterable = None,
+        run_config: RunConfig = None,
+    ):
+        self.nets = nets
+        self.run_config = run_config or nets[0].run_config
+        self.nodes = list(nodes)
+        self.blacklist = set(blacklist)
+        self.rng = random.Random(seed)
+        self._source = iter(candidates) if candidates is not None else self._random_candidates()
+        self.drawn = 0
+        self.accepted = 0
+        self.rejected_endpoints = 0
+        self.rejected_path = 0
+        self.searches = 0
+        self.expanded = 0
+        self.seconds = 0.0
+
+    def _random_candidates(self):
+        lo, hi = self.run_config.min_payment, self.run_config.max_payment
+        while True:
+            src, dst = self.rng.sample(self.nodes, 2)
+            yield src, dst, self.rng.randint(lo, hi)
+
+    def feasible(self, src: str, dst: str, amount_sat: int) -> bool:
+        for net in self.nets:
+            ok, expanded = path_exists(net, src, dst, amount_sat)
+            self.searches += 1
+            self.expanded += expanded
+            if not ok:
+                return False
+        return True
+
+    def vet(self, src: str, dst: str, amount_sat: int) -> bool:
+        """
+        Whether one candidate is acceptable, counting it either way. The set
+        lookups on its endpoints run before any path search is spent on it.
+        """
+        self.drawn += 1
+        blacklist = self.blacklist
+        if src == dst or src in blacklist or dst in blacklist:
+            self.rejected_endpoints += 1
+            return False
+        if not self.feasible(src, dst, amount_sat):
+            self.rejected_path += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def next_payment(self) -> Optional[Tuple[str, str, int]]:
+        """
+        The next acceptable payment against the networks' current state,
+        or None once the candidates run out.
+        """
+        started = time.perf_counter()
+        payment = None
+        for src, dst, amount_sat, *_ in self._source:
+            if self.vet(src, dst, amount_sat):
+                payment = (src, dst, amount_sat)
+                break
+        self.seconds += time.perf_counter() - started
+        return payment
+
+    def rejection_rate(self) -> float:
+        if self.drawn == 0:
+            return 0.0
+        return (self.drawn - self.accepted) / self.drawn
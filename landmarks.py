@@ -0,0 +1,251 @@
+import json
+import os
+import sys
+import weakref
+from array import array
+from typing import List, Optional
+
+import config
+from network import Network, load_network
+from snapshot_cache import _file_digest, _fingerprint, _restamp, cache_path
+from speedy_setup import select_landmarks_by_degree
+
+
+MAGIC = b'LNLMRK01'
+# bump whenever the layout below changes
+FORMAT_VERSION = 1
+# hop distance stored for nodes a landmark cannot reach / be reached from
+FAR = 0xFFFF
+
+
+class LandmarkTable:
+    """
+    Hop distances between every node and k landmarks on the full directed
+    channel graph, for ALT lower bounds (A*, landmarks, triangle inequality),
+    read by bfs_route's "astar" search and by pruned hop ranks (bfs.AltSearch).
+
+    Node slot x is the x-th node of sorted(net.nodes), as in RankGraph. Rows
+    are node-major: `frm[x*k + l]` is the hop distance landmark l -> x and
+    `to[x*k + l]` the distance x -> landmark l, FAR if there is no path.
+    Admissible views only drop channels, so the bounds hold for every amount.
+    """
+
+    def __init__(self, net: Network, landmarks: List[int], frm: array, to: array):
+        self.nodes, self.index = _slots(net)
+        self.landmarks = landmarks
+        self.k = len(landmarks)
+        self.frm = frm
+        self.to = to
+
+    @classmethod
+    def build(cls, net: Network, k: int) -> 'LandmarkTable':
+        nodes, index = _slots(net)
+        n = len(nodes)
+        succs: List[List[int]] = [[] for _ in range(n)]
+        preds: List[List[int]] = [[] for _ in range(n)]
+        for x, node in enumerate(nodes):
+            for v, _ in net.get_neighbors(node):
+                succs[x].append(index[v])
+                preds[index[v]].append(x)
+        landmarks = [index[node] for node in select_landmarks_by_degree(net, k)]
+        k = len(landmarks)
+        frm = array('H', [FAR]) * (n * k)
+        to = array('H', [FAR]) * (n * k)
+        for l, start in enumerate(landmarks):
+            _bfs(succs, start, frm, k, l)
+            _bfs(preds, start, to, k, l)
+        return cls(net, landmarks, frm, to)
+
+    def _rows(self, node):
+        a = self.index[node] * self.k
+        return self.frm[a:a + self.k], self.to[a:a + self.k]
+
+    def lower_bound(self, u, v) -> int:
+        """
+        Lower bound on the hop distance u -> v; FAR when v is provably unreachable.
+        """
+        return _bound(*self._rows(u), *self._rows(v))
+
+    def bound_to(self, target):
+        """
+        h(u) = lower_bound(u, target), with the target's rows fetched once.
+        """
+        k, frm, to, index = self.k, self.frm, self.to, self.index
+        t_frm, t_to = self._rows(target)
+
+        def h(u) -> int:
+            a = index[u] * k
+            return _bound(frm[a:a + k], to[a:a + k], t_frm, t_to)
+        return h
+
+    def bound_from(self, source):
+        """
+        h(v) = lower_bound(source, v), with the source's rows fetched once.
+        """
+        k, frm, to, index = self.k, self.frm, self.to, self.index
+        s_frm, s_to = self._rows(source)
+
+        def h(v) -> int:
+            b = index[v] * k
+            return _bound(s_frm, s_to, frm[b:b + k], to[b:b + k])
+        return h
+
+    def slot_bound_from(self, x: int):
+        """
+        bound_from() over node slots: h(y) = lower bound on the hops slot x -> slot y.
+        """
+        k, frm, to = self.k, self.frm, self.to
+        a = x * k
+        s_frm, s_to = frm[a:a + k], to[a:a + k]
+
+        def h(y: int) -> int:
+            b = y * k
+            return _bound(s_frm, s_to, frm[b:b + k], to[b:b + k])
+        return h
+
+
+def _slots(net: Network):
+    nodes = sorted(net.nodes)
+    if hasattr(net, 'node_ids'):
+        return nodes, range(len(nodes))
+    return nodes, {node: i for i, node in enumerate(nodes)}
+
+
+def _bound(u_frm, u_to, v_frm, v_to) -> int:
+    best = 0
+    for lu, lv, ul, vl in zip(u_frm, v_frm, u_to, v_to):
+        # d(L,v) <= d(L,u) + d(u,v)
+        if lu != FAR:
+            if lv == FAR:
+                return FAR
+            if lv - lu > best:
+                best = lv - lu
+        # d(u,L) <= d(u,v) + d(v,L)
+        if vl != FAR:
+            if ul == FAR:
+                return FAR
+            if ul - vl > best:
+                best = ul - vl
+    return best
+
+
+def _bfs(adj: List[List[int]], start: int, out: array, k: int, l: int) -> None:
+    out[start * k + l] = 0
+    frontier = [start]
+    level = 0
+    while frontier:
+        level += 1
+        nxt = []
+        for x in frontier:
+            for y in adj[x]:
+                if out[y * k + l] == FAR:
+                    out[y * k + l] = level
+                    nxt.append(y)
+        frontier = nxt
+
+
+def table_path(snapshot_path: str, k: int) -> str:
+    base = cache_path(snapshot_path)
+    return f"{base[:-len('.bin')]}.landmarks-{k}.bin"
+
+
+def save_table(table: LandmarkTable, snapshot_path: str, out_path: str = None) -> str:
+    out_path = out_path or table_path(snapshot_path, table.k)
+    header = {
+        'version': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'source': os.path.abspath(snapshot_path),
+        'sha256': _file_digest(snapshot_path),
+        'num_nodes': len(table.nodes),
+        'landmarks': table.landmarks,
+    }
+    header.update(_fingerprint(snapshot_path))
+    header_bytes = json.dumps(header).encode('utf-8')
+    # write-then-rename, as in snapshot_cache
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        f.write(table.frm.tobytes())
+        f.write(table.to.tobytes())
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _load_table(path: str, snapshot_path: str, net: Network, k: int) -> Optional[LandmarkTable]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        header = json.loads(f.read(int.from_bytes(f.read(8), 'little')))
+        if header.get('version') != FORMAT_VERSION:
+            return None
+        if header.get('byteorder') != sys.byteorder or header.get('num_nodes') != len(net.nodes):
+            return None
+        fingerprint = _fingerprint(snapshot_path)
+        touched = not all(header.get(key) == v for key, v in fingerprint.items())
+        if touched:
+            if header.get('size') != fingerprint['size'] or header.get('sha256') != _file_digest(snapshot_path):
+                return None
+        landmarks = header['landmarks']
+        if len(landmarks) != min(k, len(net.nodes)):
+            return None
+        size = len(net.nodes) * len(landmarks)
+        frm, to = array('H'), array('H')
+        frm.fromfile(f, size)
+        to.fromfile(f, size)
+    table = LandmarkTable(net, landmarks, frm, to)
+    # unchanged by content: record the new stat so later loads skip the hash
+    if touched and not _restamp(path, MAGIC, fingerprint):
+        save_table(table, snapshot_path, path)
+    return table
+
+
+def load_table(net: Network, k: int) -> LandmarkTable:
+    """
+    The k-landmark table of `net`'s snapshot, read from its cache file or built
+    and written there on first use.
+    """
+    snapshot_path = getattr(net, 'snapshot_path', None)
+    if snapshot_path is None:
+        return LandmarkTable.build(net, k)
+    path = table_path(snapshot_path, k)
+    try:
+        table = _load_table(path, snapshot_path, net, k)
+    except (OSError, EOFError, ValueError):
+        table = None
+    if table is None:
+        table = LandmarkTable.build(net, k)
+        try:
+            save_table(table, snapshot_path, path)
+        except OSError:
+            pass
+    return table
+
+
+# one table per loaded topology, shared by every overlay stacked on it
+_tables: "weakref.WeakKeyDictionary[Network, LandmarkTable]" = weakref.WeakKeyDictionary()
+
+
+def landmark_table(net: Network) -> Optional[LandmarkTable]:
+    """
+    The LandmarkTable of the topology under `net`, or None if config.LANDMARKS is 0.
+    """
+    k = config.LANDMARKS
+    if k <= 0:
+        return None
+    root = getattr(net, '_root', net)
+    table = _tables.get(root)
+    if table is None or table.k != min(k, len(root.nodes)):
+        table = _tables[root] = load_table(root, k)
+    return table
+
+
+if __name__ == "__main__":
+    # one-off precompute step: python landmarks.py [snapshot.json ...]
+    k = config.LANDMARKS or 8
+    for snapshot in sys.argv[1:] or [config.SNAPSHOT_PATH]:
+        table = LandmarkTable.build(load_network(snapshot), k)
+        print(save_table(table, snapshot))
@@ -1,9 +1,36 @@
 from typing import List, Tuple
-import config
+from run_config import RunConfig
 import sys
 import csv
 
-def report(results: List[Tuple[bool, float, int]], routing_algorithm: str) -> None:
+def summary(results: List[Tuple[bool, float, int]]) -> dict:
+    """
+    Success rate (%) and average hops, delay and fee over the successful
+    payments of one algorithm's results (averages are None without any).
+    """
+    total = len(results)
+    successes = sum(1 for success, _, _, _ in results if success == True)
+    out = {
+        'total': total,
+        'successes': successes,
+        'success_rate': (successes / total) * 100.0 if total else 0.0,
+        'hops': None,
+        'delay': None,
+        'fee': None,
+    }
+    if successes:
+        out['hops'] = sum(int(hops) for success, hops, _, _ in results if success == True) / successes
+        out['delay'] = sum(int(delay) for success, _, delay, _ in results if success == True) / successes
+        out['fee'] = sum(int(fee) for success, _, _, fee in results if success == True) / successes
+    return out
+
+
+def report(
+    results: List[Tuple[bool, float, int]],
+    routing_algorithm: str,
+    tickets=None,
+    run_config: RunConfig = None,
+) -> None:
     """
     Print summary metrics for payment simulation results.
 
@@ -12,18 +39,23 @@ def report(results: List[Tuple[bool, float, int]], routing_algorithm: str) -> No
                  - success (bool): True if payment succeeded
                  - latency_s (float): time elapsed in seconds
                  - hops (int): number of hops taken (fee metric)
+        tickets: the ticket.TicketStats of a ticket-routed run, if any
+        run_config: the settings the results were simulated with
+                    (default: the current config.py values)
     """
+    run_config = run_config or RunConfig.from_module()
     total = len(results)
     if total == 0:
         print("No simulation results to report.")
         return
 
-    successes = sum(1 for success, _, _, _ in results if success == True)
+    stats = summary(results)
+    successes = stats['successes']
     failures = total - successes
-    success_rate = (successes / total) * 100.0
-    average_hops = sum(int(hops) for success, hops, _, _ in results if success == True) / successes
-    average_delay = sum(int(delay) for success, _, delay, _ in results if success == True) / successes
-    average_fee = sum(int(fee) for success, _, _, fee in results if success == True) / successes
+    success_rate = stats['success_rate']
+    average_hops = stats['hops']
+    average_delay = stats['delay']
+    average_fee = stats['fee']
 
 
     print("===== Simulation Metrics =====")
@@ -34,13 +66,75 @@ def report(results: List[Tuple[bool, float, int]], routing_algorithm: str) -> No
     print(f"Average hops: {average_hops}")
     print(f"Average delay: {average_delay}")
     print(f"Average fees: {average_fee}")
-    print(f"BloomFilter False Positive Rate: {config.BF_FALSE_POS_RATE}")
-    print(f"BloomFilter Expected Items: {config.BF_EXPECTED_ITEMS}")
-    print(f"Min amount: {config.MIN_PAYMENT}, Max amount: {config.MAX_PAYMENT}")
-    print(f"Max candidate per node: {config.MAX_CANDIDATES}")
-    print(f"Portion of saturated channels: {config.SATURATION_PORTION}")
-    print(f"Portion of offline channels: {config.OFF_CHANNELS}")
+    print(f"BloomFilter False Positive Rate: {run_config.bf_false_pos_rate}")
+    print(f"BloomFilter Expected Items: {run_config.bf_expected_items or 'sized per ticket'}")
+    print(f"Min amount: {run_config.min_payment}, Max amount: {run_config.max_payment}")
+    print(f"Max candidate per node: {run_config.max_candidates}")
+    print(f"Portion of saturated channels: {run_config.saturation_portion}")
+    print(f"Portion of offline channels: {run_config.off_channels}")
+    if tickets is not None:
+        report_tickets(tickets, run_config)
     
     with open(sys.argv[1] + "_" + routing_algorithm + ".csv", 'w') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerows(results)
+
+
+def report_tickets(stats, run_config: RunConfig) -> None:
+    """
+    Print per-payment ticket cost from a ticket.TicketStats.
+    """
+    if stats.tickets == 0:
+        return
+    n = stats.tickets
+    print("===== Tickets =====")
+    print(f"Encoding: {run_config.ticket_encoding} ({', '.join(f'{k}: {v}' for k, v in stats.encodings.items())})")
+    print(f"Reject ticket: {'on' if run_config.reject_ticket else 'off'}")
+    print(f"Average ticket bytes per payment: {stats.ticket_bytes / n:.1f} (max {stats.max_ticket_bytes})")
+    print(f"Average build time: {stats.build_seconds / n * 1e6:.1f} us")
+    print(f"Average ticket size: {stats.ticket_bits / n:.1f} bits")
+    print(f"Reject tickets: {stats.reject_tickets}/{n}, average size: {stats.reject_bits / n:.1f} bits")
+    print(f"False-positive edges in reject tickets: {stats.rejected_edges} (+{stats.reject_hits} turned away elsewhere)")
+    if stats.lookups:
+        print(f"Membership tests: {stats.lookups / n:.1f} per payment, {stats.lookup_seconds / stats.lookups * 1e6:.2f} us each")
+    print(f"Average forwarding time: {stats.forward_seconds / n * 1e6:.1f} us")
+
+
+def report_feasibility(oracle) -> None:
+    """
+    Print how many sampled payments a feasibility.FeasibilityOracle turned away.
+    """
+    print("===== Payment Sampling =====")
+    if oracle.run_config.feasibility_mode == "scenario":
+        print("Vetted against: the scenario before any payment")
+    else:
+        print("Vetted against: every algorithm's live balances")
+    print(f"Candidates drawn: {oracle.drawn}, accepted: {oracle.accepted}")
+    print(f"Rejection rate: {oracle.rejection_rate() * 100.0:.2f}%")
+    print(f"Rejected endpoints: {oracle.rejected_endpoints}, rejected for no path: {oracle.rejected_path}")
+    if oracle.searches:
+        print(f"Path checks: {oracle.searches}, {oracle.expanded / oracle.searches:.1f} nodes expanded each")
+    if oracle.accepted:
+        print(f"Average sampling time: {oracle.seconds / oracle.accepted * 1e6:.1f} us per payment")
+
+
+def report_workers(seconds: dict, wall: float, workers: int) -> None:
+    """
+    Print per-algorithm and wall-clock time of a simulator.run_parallel run.
+    """
+    print("===== Workers =====")
+    print(f"Processes: {workers}")
+    for name, s in seconds.items():
+        print(f"{name}: {s:.2f} s")
+    busy = sum(seconds.values())
+    print(f"Wall clock: {wall:.2f} s for {busy:.2f} s of routing ({busy / wall if wall else 0.0:.2f}x)")
+
+
+def report_cache(cache, name: str) -> None:
+    """
+    Print hit/miss counters of a bfs.RankCache or bfs.CandidateCache.
+    """
+    print(f"===== {name} =====")
+    print(f"Entries: {len(cache)}/{cache.max_entries}")
+    print(f"Hits: {cache.hits}, Misses: {cache.misses}, Evictions: {cache.evictions}")
+    print(f"Hit rate: {cache.hit_rate() * 100.0:.2f}%")
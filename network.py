@@ -1,20 +1,142 @@
+import heapq
 import json
-import random
-from collections import defaultdict
+import sys
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
 import config
-from typing import List, Tuple, Dict
+from embedding import TreeEmbedding
+from run_config import RunConfig
+from typing import Iterator, List, Tuple, Dict
 from collections import defaultdict
 from typing import Dict, List, Tuple
-import networkx as nx
+
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _JSONStream:
+    """
+    Minimal pull reader over a JSON file: values are decoded one at a time
+    from a sliding buffer, so only the current value is ever held in memory.
+    """
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # drop the consumed prefix so the buffer stays around one chunk long
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"malformed snapshot: expected {ch!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number (or literal) cut by the chunk boundary decodes "successfully"
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def items(self, close: str, keyed: bool) -> Iterator:
+        if self.peek() == close:
+            self.pos += 1
+            return
+        while True:
+            key = None
+            if keyed:
+                key = self.value()
+                self.expect(':')
+            yield key, self.value()
+            sep = self.peek()
+            self.pos += 1
+            if sep == close:
+                return
+            if sep != ',':
+                raise ValueError(f"malformed snapshot: unexpected {sep!r} at offset {self.pos - 1}")
+
+
+def iter_snapshot_entries(path: str, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """
+    Yield the entries of a listchannels snapshot's `channels` collection one by one.
+
+    Accepts both the list form and the dict (id -> entry) form. The document is
+    decoded incrementally, so peak memory is one read chunk plus one entry rather
+    than the whole JSON object tree.
+    """
+    with open(path, 'r') as f:
+        stream = _JSONStream(f, chunk_size)
+        _seek_member(stream, 'channels')
+        opening = stream.peek()
+        if opening == '[':
+            stream.pos += 1
+            for _, entry in stream.items(']', keyed=False):
+                yield entry
+        elif opening == '{':
+            stream.pos += 1
+            for _, entry in stream.items('}', keyed=True):
+                yield entry
+
+
+def _seek_member(stream: _JSONStream, name: str) -> None:
+    """
+    Skip top-level members until the value of `name` is next in the stream.
+    """
+    stream.expect('{')
+    if stream.peek() != '}':
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if key == name:
+                return
+            stream.value()
+            sep = stream.peek()
+            stream.pos += 1
+            if sep != ',':
+                break
+    raise KeyError(name)
+
 
 class Channel:
     """
     Represents a Lightning Network channel with directed capacity split.
     """
 
-    def __init__(self, entry: dict):
-        self.u = entry['source']
-        self.v = entry['destination']
+    def __init__(self, entry: dict, split: float):
+        # node ids repeat across thousands of entries; share one string per node
+        self.u = sys.intern(entry['source'])
+        self.v = sys.intern(entry['destination'])
         self.id = entry['short_channel_id']
         self.public = entry.get('public', False)
         self.active = entry.get('active', False)
@@ -25,7 +147,7 @@ class Channel:
 
         total_capacity = int(entry.get('satoshis', 0))
         self.total_capacity = total_capacity
-        half = int(total_capacity * config.SPLIT_CHANNEL_PERCENT)
+        half = int(total_capacity * split)
         self.capacity_uv = half
         self.capacity_vu = total_capacity - half
 
@@ -62,6 +184,38 @@ class Channel:
         self.bi = True
 
 
+    @classmethod
+    def from_compiled(cls, snap, c: int, split: float) -> 'Channel':
+        """
+        Rebuild channel `c` of a CompiledSnapshot without going through JSON;
+        `split` is the share of the capacity on the u side.
+        """
+        chan = cls.__new__(cls)
+        chan.u = snap.node_ids[snap.chan_u[c]]
+        chan.v = snap.node_ids[snap.chan_v[c]]
+        chan.id = snap.chan_ids[c]
+        chan.public = True
+        chan.active = True
+        flags = snap.flags[c]
+        chan.disabled = bool(flags & 2)
+        chan.message_flags = snap.message_flags[c]
+
+        total_capacity = snap.total_capacity[c]
+        chan.total_capacity = total_capacity
+        half = int(total_capacity * split)
+        chan.capacity_uv = half
+        chan.capacity_vu = total_capacity - half
+
+        chan.base_fee_msat_u, chan.base_fee_msat_v = snap.base_fee[2 * c], snap.base_fee[2 * c + 1]
+        chan.fee_proportional_millionths_u, chan.fee_proportional_millionths_v = snap.fee_rate[2 * c], snap.fee_rate[2 * c + 1]
+        chan.htlc_min_msat_u, chan.htlc_min_msat_v = snap.htlc_min[2 * c], snap.htlc_min[2 * c + 1]
+        chan.htlc_max_msat_u, chan.htlc_max_msat_v = snap.htlc_max[2 * c], snap.htlc_max[2 * c + 1]
+        chan.delay_u, chan.delay_v = snap.delay[2 * c], snap.delay[2 * c + 1]
+        chan.bi = bool(flags & 1)
+        chan.online = True
+        return chan
+
+
     def get_capacity(self, from_node: str) -> int:
         if from_node == self.u:
             return self.capacity_uv
@@ -116,21 +270,41 @@ class Channel:
 
 
 
+def load_network(snapshot_path: str, run_config: RunConfig = None) -> 'Network':
+    """
+    Build the network for `snapshot_path` on the backend selected by config.NETWORK_BACKEND.
+    """
+    if config.NETWORK_BACKEND == 'arrays':
+        # imported here: array_network subclasses Network
+        from array_network import ArrayNetwork
+        return ArrayNetwork(snapshot_path, run_config)
+    return Network(snapshot_path, run_config)
+
+
 class Network:
     """
     Directed Lightning Network graph from JSON snapshot.
 
     - Only includes channels that are public, active, and not disabled.
     - Builds a directed adjacency list: node -> list of (neighbor_id, channel_id).
+    - `run_config` (default: the current config.py values) sets the initial
+      balances and is what routers read their settings from.
     """
-    def __init__(self, snapshot_path: str):
+    def __init__(self, snapshot_path: str, run_config: RunConfig = None):
+        self.snapshot_path = snapshot_path
+        self.run_config = run_config or RunConfig.from_module()
         self.nodes = set()
-        self.graph = nx.MultiDiGraph()
+        self._graph = None           # networkx view, see `graph`
         self.channels = {}           # chan_id -> Channel
         self.adj = defaultdict(list) # node_id -> List[(neighbor_id, chan_id)]
         self._load_snapshot(snapshot_path)
-        self.coordinates: Dict[Tuple[str,int], List[int]] = {}
+        self.embeddings: Dict[int, TreeEmbedding] = {}   # tree_id -> SpeedyMurmurs tree
         self.stab_msg_count = 0   # counter for on-demand stabilization messages
+        self._first_channel = None   # (u, v) index, see _build_pair_index
+        self._amount_breakpoints = None
+        self._node_slot = None
+        self._adj_views = OrderedDict()
+        self._view_ranges = {}
         self.nodes = sorted(self.nodes)
         self.rev_adj: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
         for u in self.nodes:
@@ -138,6 +312,26 @@ class Network:
                 self.rev_adj[v].append((u, cid))
 
 
+    @property
+    def graph(self):
+        """
+        networkx MultiDiGraph mirror of `adj`, built on first access only;
+        `del net.graph` releases it again.
+        """
+        if self._graph is None:
+            import networkx as nx
+            graph = nx.MultiDiGraph()
+            for u in self.adj:
+                for v, cid in self.get_neighbors(u):
+                    graph.add_edge(u, v, key=cid, weight=self.get_capacity(cid, u))
+            self._graph = graph
+        return self._graph
+
+    @graph.deleter
+    def graph(self):
+        self._graph = None
+
+
     def update_networkx_graph(self):
         for chan in self.channels.values():
             if not chan.online:
@@ -148,16 +342,18 @@ class Network:
 
 
     def _load_snapshot(self, path: str):
-        with open(path, 'r') as f:
-            data = json.load(f)['channels']
-
-        entries = data.values() if isinstance(data, dict) else data if isinstance(data, list) else []
-
-        for entry in entries:
+        if config.SNAPSHOT_CACHE:
+            # imported here: snapshot_cache itself builds on Channel
+            from snapshot_cache import load_compiled
+            self._load_compiled(load_compiled(path))
+            return
+        # entries are decoded and turned into channels one at a time, so the
+        # raw JSON tree is never materialised next to the graph
+        for entry in iter_snapshot_entries(path):
             if not isinstance(entry, dict):
                 continue
 
-            chan = Channel(entry)
+            chan = Channel(entry, self.run_config.split_channel_percent)
             # Filter non-public, inactive, or disabled channels
             if not chan.public or not chan.active:
                 continue
@@ -166,14 +362,32 @@ class Network:
                 existing_chan = self.channels[chan.id]
                 existing_chan.update(entry)
                 self.adj[chan.u].append((chan.v, chan.id))
-                self.graph.add_edge(chan.u, chan.v, key=chan.id, weight=chan.capacity_vu)
             else:
                 self.channels[chan.id] = chan
                 self.nodes.add(chan.u)
                 self.nodes.add(chan.v)
                 # Add directed edges
                 self.adj[chan.u].append((chan.v, chan.id))
-                self.graph.add_edge(chan.u, chan.v, key=chan.id, weight=chan.capacity_uv)
+
+
+    def _load_compiled(self, snap) -> None:
+        """
+        Populate channels and adjacency from a CompiledSnapshot.
+        """
+        node_ids = snap.node_ids
+        self.nodes.update(node_ids)
+        split = self.run_config.split_channel_percent
+        chans = [Channel.from_compiled(snap, c, split) for c in range(snap.num_channels)]
+        for chan in chans:
+            self.channels[chan.id] = chan
+        offsets, edges = snap.adj_offsets, snap.adj_edges
+        for x in snap.adj_order:
+            u = node_ids[x]
+            out = self.adj[u]
+            for e in edges[offsets[x]:offsets[x + 1]]:
+                chan = chans[e >> 1]
+                v = chan.u if e & 1 else chan.v
+                out.append((v, chan.id))
 
 
     def get_neighbors(self, node_id: str) -> List[Tuple[str, str]]:
@@ -183,34 +397,257 @@ class Network:
         return self.adj.get(node_id, [])
 
 
+    # Channel accessors. Routers read and update channels only through these,
+    # keyed by the channel id found in the adjacency, so the same code runs on
+    # ArrayNetwork where a channel is a column index rather than an object.
+
+    def edge_key(self, u: str, v: str) -> int:
+        """
+        Integer key naming the directed node pair u->v, e.g. in ticket Bloom
+        filters: slot(u) * n + slot(v) over sorted node ids, as in ArrayNetwork.
+        """
+        slot = self.node_slots()
+        return slot[u] * len(slot) + slot[v]
+
+    def node_slots(self) -> Dict[str, int]:
+        """
+        Slot of every node in sorted(nodes), built on first use.
+        """
+        if self._node_slot is None:
+            self._node_slot = {node: i for i, node in enumerate(sorted(self.nodes))}
+        return self._node_slot
+
+    def channel_ids(self) -> List[str]:
+        return list(self.channels)
+
+    def channel_by_id(self, short_channel_id: str) -> str:
+        return short_channel_id if short_channel_id in self.channels else None
+
+    def is_admissible(self, cid: str, from_node: str, amount_sat: int) -> bool:
+        """
+        Static check: channel size and the HTLC bounds of the `from_node` side allow `amount_sat`.
+        """
+        chan = self.channels[cid]
+        if chan.total_capacity < amount_sat:
+            return False
+        amt_msat = amount_sat * 1000
+        return chan.get_htlc_min_msat(from_node) <= amt_msat <= chan.get_htlc_max_msat(from_node)
+
+    def admissible_neighbors(self, node_id: str, amount_sat: int) -> List[Tuple[str, str]]:
+        """
+        Outgoing (neighbor_id, channel_id) pairs that pass is_admissible for `amount_sat`.
+        """
+        return self.admissible_adj(amount_sat).get(node_id, [])
+
+    def admissible_predecessors(self, node_id: str, amount_sat: int) -> List[Tuple[str, str]]:
+        """
+        Incoming (neighbor_id, channel_id) pairs whose neighbor->node direction passes is_admissible.
+        """
+        return self.admissible_rev_adj(amount_sat).get(node_id, [])
+
+    def admissible_adj(self, amount_sat: int):
+        """
+        `adj` restricted to the directions that pass is_admissible for `amount_sat`.
+
+        Size and HTLC bounds never change, so there is one view per amount
+        class, built on first use and kept in a small LRU
+        (config.ADJ_VIEW_CACHE_SIZE). Routers fetch it once per payment and
+        only check balance and online in their loops. Views are shared and
+        must not be mutated.
+        """
+        return self._admissible_view('adj', amount_sat)
+
+    def admissible_rev_adj(self, amount_sat: int):
+        """
+        `rev_adj` restricted like admissible_adj.
+        """
+        return self._admissible_view('rev_adj', amount_sat)
+
+    def _admissible_view(self, kind: str, amount_sat: int):
+        key = (kind, self.amount_class(amount_sat))
+        views = self._adj_views
+        view = views.get(key)
+        if view is not None:
+            views.move_to_end(key)
+            return view
+        view = views[key] = self._build_view(kind, amount_sat)
+        if len(views) > config.ADJ_VIEW_CACHE_SIZE:
+            views.popitem(last=False)
+        return view
+
+    def _build_view(self, kind: str, amount_sat: int) -> Dict[str, List[Tuple[str, str]]]:
+        adj = getattr(self, kind)
+        ranges = self._view_ranges.get(kind)
+        if ranges is None:
+            # the channel direction of an entry starts at x in adj and at the neighbor in rev_adj
+            if kind == 'adj':
+                ranges = {x: [self.amount_range(cid, x) for _, cid in entries] for x, entries in adj.items()}
+            else:
+                ranges = {x: [self.amount_range(cid, u) for u, cid in entries] for x, entries in adj.items()}
+            self._view_ranges[kind] = ranges
+        view = {}
+        for x, entries in adj.items():
+            kept = [e for e, (lo, hi) in zip(entries, ranges[x]) if lo <= amount_sat <= hi]
+            # nodes whose channels all pass share their full list
+            view[x] = entries if len(kept) == len(entries) else kept
+        return view
+
+    def endpoints(self, cid: str) -> Tuple[str, str]:
+        chan = self.channels[cid]
+        return chan.u, chan.v
+
+    def amount_range(self, cid: str, from_node: str) -> Tuple[int, int]:
+        """
+        Inclusive range of whole-sat amounts that pass is_admissible in this direction.
+        """
+        chan = self.channels[cid]
+        lo = -(-chan.get_htlc_min_msat(from_node) // 1000)
+        hi = min(chan.total_capacity, chan.get_htlc_max_msat(from_node) // 1000)
+        return lo, hi
+
+    def _build_amount_breakpoints(self) -> List[int]:
+        points = set()
+        for u in self.adj:
+            for _, cid in self.get_neighbors(u):
+                lo, hi = self.amount_range(cid, u)
+                points.add(lo)
+                points.add(hi + 1)
+        return sorted(points)
+
+    def amount_class(self, amount_sat: int) -> int:
+        """
+        Id of the amount class `amount_sat` falls in. Classes are the intervals
+        between consecutive channel admissibility bounds, so every amount in a
+        class passes is_admissible on exactly the same set of directed channels.
+        """
+        if self._amount_breakpoints is None:
+            self._amount_breakpoints = self._build_amount_breakpoints()
+        return bisect_right(self._amount_breakpoints, amount_sat)
+
+    def get_capacity(self, cid: str, from_node: str) -> int:
+        return self.channels[cid].get_capacity(from_node)
+
+    def get_total_capacity(self, cid: str) -> int:
+        return self.channels[cid].total_capacity
+
+    def get_htlc_min_msat(self, cid: str, from_node: str) -> int:
+        return self.channels[cid].get_htlc_min_msat(from_node)
+
+    def get_htlc_max_msat(self, cid: str, from_node: str) -> int:
+        return self.channels[cid].get_htlc_max_msat(from_node)
+
+    def get_base_fee_msat(self, cid: str, from_node: str, amount: int) -> int:
+        return self.channels[cid].get_base_fee_msat(from_node, amount)
+
+    def get_fee_rate(self, cid: str, from_node: str) -> int:
+        chan = self.channels[cid]
+        if from_node == chan.u:
+            return chan.fee_proportional_millionths_u
+        if from_node == chan.v:
+            return chan.fee_proportional_millionths_v
+        return 0
+
+    def get_delay(self, cid: str, from_node: str) -> int:
+        return self.channels[cid].get_delay(from_node)
+
+    def is_online(self, cid: str) -> bool:
+        return self.channels[cid].online
+
+    def set_online(self, cid: str, online: bool) -> None:
+        self.channels[cid].online = online
+
+    def is_bidirectional(self, cid: str) -> bool:
+        return self.channels[cid].bi
+
+    def reduce_capacity(self, cid: str, from_node: str, amount: int) -> None:
+        self.channels[cid].reduce_capacity(from_node, amount)
+
+    def increase_capacity(self, cid: str, from_node: str, amount: int) -> None:
+        self.channels[cid].increase_capacity(from_node, amount)
+
+    def saturate_channel(self, cid: str) -> None:
+        """
+        Move the whole channel balance to the u side.
+        """
+        chan = self.channels[cid]
+        chan.capacity_uv = chan.total_capacity
+        chan.capacity_vu = 0
+
+
     def print(self) -> None:
         """
         Print the directed graph: for each node, list outgoing edges with channel id and directed capacity.
         """
         for node in sorted(self.nodes):
             print(f"Node {node}:")
-            for neighbor, chan_id in self.adj.get(node, []):
-                cap = self.channels[chan_id].get_capacity(node)
-                online = self.channels[chan_id].online
+            for neighbor, chan_id in self.get_neighbors(node):
+                cap = self.get_capacity(chan_id, node)
+                online = self.is_online(chan_id)
                 print(f"  -> {neighbor} via {chan_id} (cap={cap} sats) online {online}")
 
 
-    def set_coordinate(self, node_id: str, tree_id: int, coordinate: List[int]) -> None:
-        if node_id not in self.coordinates:
-            self.coordinates[node_id] = {}
+    def set_root(self, node_id: str, tree_id: int) -> None:
+        """
+        Start embedding `tree_id` afresh with `node_id` as its root.
+        """
+        self.stab_msg_count += 1
+        self.embeddings[tree_id] = TreeEmbedding(self.nodes, self.node_slots(), node_id)
+
+
+    def set_parent(self, node_id: str, tree_id: int, parent: str) -> None:
         self.stab_msg_count += 1
-        self.coordinates[node_id][tree_id] = coordinate
+        self.embeddings[tree_id].attach(node_id, parent)
+
+
+    def tree_distance(self, a: str, b: str, tree_id: int) -> int:
+        """
+        Hop distance between a and b in tree `tree_id` (0 if it was never built).
+        """
+        tree = self.embeddings.get(tree_id)
+        if tree is None:
+            return 0
+        return tree.distance(a, b)
+
 
+    def _pair_key(self, u: str, v: str):
+        return (u, v)
 
-    def get_coordinate(self, node_id: str, tree_id: int) -> List[int]:
-        return self.coordinates.get(node_id, {}).get(tree_id, [])
+    def _build_pair_index(self) -> None:
+        """
+        Index the adjacency by directed node pair.
 
+        `_first_channel` holds the first channel in adjacency order for every
+        pair; pairs joined by parallel channels also list the others, in order,
+        in `_parallel_channels`.
+        """
+        first: Dict = {}
+        parallel: Dict = {}
+        for u in self.adj:
+            for v, cid in self.get_neighbors(u):
+                key = self._pair_key(u, v)
+                if key not in first:
+                    first[key] = cid
+                else:
+                    parallel.setdefault(key, []).append(cid)
+        self._first_channel = first
+        self._parallel_channels = parallel
 
     def find_channel_id(self, u: str, v: str) -> str:
-        for neighbor, cid in self.get_neighbors(u):
-            if neighbor == v:
-                return cid
-        return None
+        """
+        Channel carrying u->v; with parallel channels, the first one in u's adjacency.
+        """
+        if self._first_channel is None:
+            self._build_pair_index()
+        return self._first_channel.get(self._pair_key(u, v))
+
+    def find_channel_ids(self, u: str, v: str) -> List[str]:
+        """
+        Every channel carrying u->v, in adjacency order.
+        """
+        first = self.find_channel_id(u, v)
+        if first is None:
+            return []
+        return [first] + self._parallel_channels.get(self._pair_key(u, v), [])
 
 
     def set_cred(self, u: str, v: str, new_capacity: int) -> None:
@@ -221,79 +658,80 @@ class Network:
         cid = self.find_channel_id(u, v)
         if cid is None:
             return
-        chan = self.channels[cid]
-        old_uv, old_vu = chan.cap_uv, chan.cap_vu
-        # update directed capacity
-        if (u, v) == (chan.u, chan.v):
-            chan.cap_uv = new_capacity
-        elif (u, v) == (chan.v, chan.u):
-            chan.cap_vu = new_capacity
-        else:
-            return
-        # reset soft mirrors
-        chan.available_uv = chan.cap_uv
-        chan.available_vu = chan.cap_vu
-        # detect zero<->nonzero flip
-        flipped = ((old_uv == 0) != (chan.cap_uv == 0)) or ((old_vu == 0) != (chan.cap_vu == 0))
-        if not flipped:
+        was_open = self.directions_open(cid)
+        delta = new_capacity - self.get_capacity(cid, u)
+        if delta > 0:
+            self.increase_capacity(cid, u, delta)
+        elif delta < 0:
+            self.reduce_capacity(cid, u, -delta)
+        self.restabilize(cid, was_open)
+
+
+    def directions_open(self, cid: str) -> Tuple[bool, bool]:
+        """
+        Whether each direction of the channel (u->v, v->u) has capacity left.
+        """
+        u, v = self.endpoints(cid)
+        return self.get_capacity(cid, u) > 0, self.get_capacity(cid, v) > 0
+
+
+    def restabilize(self, cid: str, was_open: Tuple[bool, bool]) -> None:
+        """
+        On-demand stabilization after a capacity change on `cid`, given its
+        directions_open() from before the change. Only a zero<->nonzero flip
+        matters. In every tree where the channel is a tree link, the child's
+        subtree is reattached; a node outside a tree joins it over the channel.
+        """
+        if not self.embeddings or self.directions_open(cid) == was_open:
             return
-        # perform on-demand stabilization for each tree
-        for tree_id in range(config.NUM_TREES):
-            # check if u or v belong in this tree
-            # if either has a coord, reset that subtree
-            if self.get_coordinate(u, tree_id):
-                self._reset_subtree(tree_id, u)
-            if self.get_coordinate(v, tree_id):
+        u, v = self.endpoints(cid)
+        for tree_id, tree in self.embeddings.items():
+            if u not in tree or v not in tree:
+                self._reattach(tree_id, [x for x in (u, v) if x not in tree])
+            elif tree.parent_of(v) == u:
                 self._reset_subtree(tree_id, v)
+            elif tree.parent_of(u) == v:
+                self._reset_subtree(tree_id, u)
 
 
     def _reset_subtree(self, tree_id: int, root: str) -> None:
         """
-        Reset coordinates of `root` and its descendants in tree `tree_id`.
-        Then reattach them by choosing new parents via two-phase BFS logic.
+        Detach `root` and its descendants from tree `tree_id`, then reattach
+        them. The tree's root and nodes outside the tree are left alone.
         """
-        # collect old prefix
-        old_prefix = self.get_coordinate(root, tree_id)
-        if not old_prefix:
+        tree = self.embeddings.get(tree_id)
+        if tree is None or root not in tree or tree.depth_of(root) == 0:
             return
-        # find nodes to reset (prefix match)
-        to_reset = []
-        for node, coords in list(self.coordinates.items()):
-            coord = coords.get(tree_id)
-            if coord and coord[:len(old_prefix)] == old_prefix:
-                to_reset.append(node)
-        # delete old coords
-        for node in to_reset:
-            del self.coordinates[node][tree_id]
-        # reinsert nodes by increasing depth
-        to_reset.sort(key=lambda n: len(self.get_coordinate(n, tree_id)))
-        for node in to_reset:
-            # find candidate parents
-            best_parent = None
-            best_len = float('inf')
-            # phase 1: bidirectional links
-            for nbr, cid in self.get_neighbors(node):
-                if (nbr in self.coordinates) and (tree_id in self.coordinates[nbr]):
-                    # check bidirectional
-                    chan = self.channels[cid]
-                    if chan.cap_uv > 0 and chan.cap_vu > 0:
-                        parent_coord = self.coordinates[nbr][tree_id]
-                        if len(parent_coord) < best_len:
-                            best_len = len(parent_coord)
-                            best_parent = nbr
-            # phase 2: unidirectional if none
-            if not best_parent:
-                for nbr, cid in self.get_neighbors(node):
-                    if (nbr in self.coordinates) and (tree_id in self.coordinates[nbr]):
-                        parent_coord = self.coordinates[nbr][tree_id]
-                        if len(parent_coord) < best_len:
-                            best_len = len(parent_coord)
-                            best_parent = nbr
-            if best_parent:
-                # assign new coordinate
-                parent_coord = self.coordinates[best_parent][tree_id]
-                # random b-bit suffix
-                suffix = random.getrandbits(config.COORD_BITS if hasattr(config, 'COORD_BITS') else 64)
-                new_coord = parent_coord + [suffix]
-                self.set_coordinate(node, tree_id, new_coord)
+        self._reattach(tree_id, tree.detach_subtree(root))
 
+
+    def _reattach(self, tree_id: int, detached: List[str]) -> None:
+        """
+        Give detached nodes new parents with the two phases of set_routes:
+        first over links open in both directions, then over any non-zero
+        link. A parent p of x is a predecessor (p -> x in adj) already in the
+        tree; within a phase, nodes attach in order of their new depth, so
+        each takes the shallowest parent it can reach. Nodes that cannot
+        reach the tree stay outside it.
+        """
+        tree = self.embeddings[tree_id]
+        pending = set(detached)
+        both_open = lambda cid: all(self.directions_open(cid))
+        nonzero = lambda cid: self.get_total_capacity(cid) > 0
+        for usable in (both_open, nonzero):
+            heap = []
+            for x in pending:
+                for p, cid in self.rev_adj.get(x, ()):
+                    if p in tree and usable(cid):
+                        heap.append((tree.depth_of(p) + 1, x, p))
+            heapq.heapify(heap)
+            while heap:
+                depth, x, p = heapq.heappop(heap)
+                if x not in pending:
+                    continue
+                pending.discard(x)
+                self.set_parent(x, tree_id, p)
+                # x is now a parent candidate for its pending successors
+                for y, cid in self.get_neighbors(x):
+                    if y in pending and usable(cid):
+                        heapq.heappush(heap, (depth + 1, y, x))
@@ -1,10 +1,10 @@
-from bfs import compute_rank, candidate_channels
-from bloom_filter import BloomFilter
+from bfs import candidates
 from network import Network
-import config
 import random
+import time
 from typing import Tuple
 from tools import commit_capacity
+from ticket import ForwardingTable, build_ticket, build_reject_ticket, ticket_keys, ticket_stats
 
 
 
@@ -27,87 +27,67 @@ def route_subpayment(
       - cltv_delay: total CLTV delay
     """
     # Initialize Bloom filter for quick membership testing
+    started = time.perf_counter()
+    keys = ticket_keys(net, channels)
+    bf = build_ticket(net, channels, keys)
+    # reject ticket: the primary's false positives at candidate nodes
+    bf_exclude = build_reject_ticket(net, channels, bf, keys) if net.run_config.reject_ticket else None
+    forward_started = time.perf_counter()
+    ticket_stats.record_build(bf, bf_exclude, forward_started - started)
+    table = ForwardingTable(net, channels, bf, bf_exclude)
 
-    # counter1 = set()
-    # for c, val in channels.items():
-    #     for neigh, v in val:
-    #         counter1.add(c+neigh)
-    
-    bf = BloomFilter(config.BF_EXPECTED_ITEMS, config.BF_FALSE_POS_RATE)
-    for c, val in channels.items():
-        for nei, v in val:
-            bf.add(c + nei)
-    # # print(counter)
-    counter2 = set()
-    for c, cands in channels.items():
-        neighbors = list(net.get_neighbors(c))
-        # print(len(neighbors))
-        for n in neighbors:
-            if c + n[0] in bf and n not in cands:
-                counter2.add(c + n[0])
-
-    # bf_exclude = BloomFilter(len(counter2), config.BF_FALSE_POS_RATE)
-    # for c in counter2:
-    #     bf_exclude.add(c)
-    
     cur = src
     hops = 0
     cltv_delay = 0
     base_fees = 0
     father = fath
-    path = [src]
+    route = []    # (u, v, channel_id) hops taken
 
     while cur != dst:
         success_hop = False
-        neighbors = list(net.get_neighbors(cur))
-        
-        while neighbors:
-            adj, cid = random.choice(neighbors)
-
-            neighbors.remove((adj, cid))
+        # ticket edges at cur, tried in random order: a Fisher-Yates shuffle
+        # that stops at the first usable edge
+        edges = list(table.edges_at(cur))
+        n = len(edges)
+        for i in range(n):
+            j = random.randrange(i, n)
+            edges[i], edges[j] = edges[j], edges[i]
+            adj, cid = edges[i]
             if father == adj:
                 continue
 
-            if cur + adj not in bf:
-                continue
-            
-            # if cur + adj in bf_exclude:
-            #     continue
-
-            channel = net.channels[cid]
-            
             # Capacity check
-            if not channel.online:
+            if not net.is_online(cid):
                 continue
-            if channel.get_capacity(cur) < amount:
+            if net.get_capacity(cid, cur) < amount:
                 continue
 
-            if amount * 1000 < channel.get_htlc_min_msat(cur) or amount * 1000 > channel.get_htlc_max_msat(cur):
+            if amount * 1000 < net.get_htlc_min_msat(cid, cur) or amount * 1000 > net.get_htlc_max_msat(cid, cur):
                 continue
 
             hops += 1
-            cltv_delay += channel.get_delay(cur)
-            base_fees += channel.get_base_fee_msat(cur, amount)
+            cltv_delay += net.get_delay(cid, cur)
+            base_fees += net.get_base_fee_msat(cid, cur, amount)
             # print("OUR FEE: ", base_fees)
 
             # Move to next node
             father = cur           
-            cur = channel.v if channel.u == cur else channel.u
+            route.append((cur, adj, cid))
+            cur = adj
             success_hop = True
-            path.append(cur)
             break
 
         if not success_hop:
             # no viable channel left at this hop
+            ticket_stats.record_forward(bf, bf_exclude, time.perf_counter() - forward_started)
             return False, hops, cltv_delay, base_fees, []
 
     # Reached destination
-    
-    return True, hops, cltv_delay, base_fees, path
+    ticket_stats.record_forward(bf, bf_exclude, time.perf_counter() - forward_started)
+    return True, hops, cltv_delay, base_fees, route
 
 def our_route(net: Network, src: str, dst: str, amt: int):
-    rank = compute_rank(net, dst, amt)
-    F = candidate_channels(net, rank, amt, src, dst)
+    F = candidates(net, src, dst, amt)
     routes = list(F[src])           
     success = False
     hops = 0
@@ -116,20 +96,20 @@ def our_route(net: Network, src: str, dst: str, amt: int):
     while routes:
     #for r in routes:
         r = random.choice(routes)
-        chan = net.channels[r[1]]
+        cid = r[1]
         routes.remove(r)
-        if chan.get_capacity(src) < amt:
+        if net.get_capacity(cid, src) < amt:
             continue
-        if amt * 1000 < chan.get_htlc_min_msat(src) or amt * 1000 > chan.get_htlc_max_msat(src):
+        if amt * 1000 < net.get_htlc_min_msat(cid, src) or amt * 1000 > net.get_htlc_max_msat(cid, src):
             continue
-        if not chan.online:
+        if not net.is_online(cid):
             continue
         # print("OUR FEE", chan.get_base_fee_msat(src, amt))
-        s, hops, cltv, base_fees, path = route_subpayment(net, r[0], dst, amt, F, src)
+        s, hops, cltv, base_fees, route = route_subpayment(net, r[0], dst, amt, F, src)
         if s:
             success = True
-            commit_capacity(net, [src] + path, amt)
-            return s, hops + 1, cltv + chan.get_delay(src), base_fees + chan.get_base_fee_msat(src, amt)
+            commit_capacity(net, [(src, r[0], cid)] + route, amt)
+            return s, hops + 1, cltv + net.get_delay(cid, src), base_fees + net.get_base_fee_msat(cid, src, amt)
         break
 
     if not success:
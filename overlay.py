@@ -0,0 +1,141 @@
+from typing import Dict, Set, Tuple
+
+from network import Network
+from run_config import RunConfig
+
+
+# topology and static channel data are read straight from the parent
+_SHARED = (
+    'get_neighbors',
+    'admissible_neighbors',
+    'admissible_predecessors',
+    'admissible_adj',
+    'admissible_rev_adj',
+    'is_admissible',
+    'amount_range',
+    'amount_class',
+    'get_total_capacity',
+    'get_htlc_min_msat',
+    'get_htlc_max_msat',
+    'get_base_fee_msat',
+    'get_fee_rate',
+    'get_delay',
+    'is_bidirectional',
+    'endpoints',
+    'edge_key',
+    'channel_ids',
+    'channel_by_id',
+    'find_channel_id',
+    'find_channel_ids',
+)
+
+
+class CapacityOverlay:
+    """
+    Copy-on-write view of a Network that owns only the state that changes
+    while routing: directed capacities and channel online flags.
+
+    Reads fall through to the parent (a Network, ArrayNetwork or another
+    overlay) until a channel is written, so any number of algorithms or
+    scenarios can share one loaded topology. The override dicts double as the
+    change journal: `reset()` drops them and costs O(changed channels).
+    SpeedyMurmurs coordinates are per overlay as well.
+
+    The overlay runs with `run_config` (default: its parent's). When that
+    asks for a different initial balance split, every channel's balance is
+    written into a base layer under the overlay's changes, as loading the
+    snapshot with it would have; `reset()` keeps that layer.
+    """
+
+    def __init__(self, parent, run_config: RunConfig = None):
+        self.parent = parent
+        self.run_config = run_config or parent.run_config
+        self.nodes = parent.nodes
+        self.adj = parent.adj
+        self.rev_adj = parent.rev_adj
+        for name in _SHARED:
+            setattr(self, name, getattr(parent, name))
+
+        self._capacity: Dict[Tuple[str, str], int] = {}   # (cid, from_node) -> capacity
+        self._online: Dict[str, bool] = {}
+        split = self.run_config.split_channel_percent
+        own_layers: Tuple[Dict, ...] = (self._capacity,)
+        if split != parent.run_config.split_channel_percent:
+            balances: Dict[Tuple[str, str], int] = {}
+            for cid in parent.channel_ids():
+                u, v = parent.endpoints(cid)
+                total = parent.get_total_capacity(cid)
+                half = int(total * split)
+                balances[(cid, u)] = half
+                balances[(cid, v)] = total - half
+            own_layers += (balances,)
+        # stacked overlays read every layer's dict, then the underlying network
+        # once, instead of calling through each parent in turn
+        if isinstance(parent, CapacityOverlay):
+            self._capacity_layers = own_layers + parent._capacity_layers
+            self._online_layers = (self._online,) + parent._online_layers
+            self._root = parent._root
+        else:
+            self._capacity_layers = own_layers
+            self._online_layers = (self._online,)
+            self._root = parent
+        self.embeddings = {}
+        self.stab_msg_count = 0
+
+    def __getattr__(self, name):
+        # anything else (node_ids, graph, ...) belongs to the shared topology
+        if name == 'parent':
+            raise AttributeError(name)
+        return getattr(self.parent, name)
+
+    set_root = Network.set_root
+    set_parent = Network.set_parent
+    tree_distance = Network.tree_distance
+    set_cred = Network.set_cred
+    directions_open = Network.directions_open
+    restabilize = Network.restabilize
+    _reset_subtree = Network._reset_subtree
+    _reattach = Network._reattach
+
+    def get_capacity(self, cid: str, from_node: str) -> int:
+        key = (cid, from_node)
+        for layer in self._capacity_layers:
+            cap = layer.get(key)
+            if cap is not None:
+                return cap
+        return self._root.get_capacity(cid, from_node)
+
+    def set_capacity(self, cid: str, from_node: str, capacity: int) -> None:
+        self._capacity[(cid, from_node)] = capacity
+
+    def reduce_capacity(self, cid: str, from_node: str, amount: int) -> None:
+        self._capacity[(cid, from_node)] = max(0, self.get_capacity(cid, from_node) - amount)
+
+    def increase_capacity(self, cid: str, from_node: str, amount: int) -> None:
+        self._capacity[(cid, from_node)] = max(0, self.get_capacity(cid, from_node) + amount)
+
+    def saturate_channel(self, cid: str) -> None:
+        u, v = self.endpoints(cid)
+        self._capacity[(cid, u)] = self.get_total_capacity(cid)
+        self._capacity[(cid, v)] = 0
+
+    def is_online(self, cid: str) -> bool:
+        for layer in self._online_layers:
+            online = layer.get(cid)
+            if online is not None:
+                return online
+        return self._root.is_online(cid)
+
+    def set_online(self, cid: str, online: bool) -> None:
+        self._online[cid] = online
+
+    def changed_channels(self) -> Set[str]:
+        return {cid for cid, _ in self._capacity} | set(self._online)
+
+    def reset(self) -> None:
+        """
+        Drop every change so the overlay reads as it did when created: its
+        parent, under its own balance split if it has one.
+        """
+        self._capacity.clear()
+        self._online.clear()
@@ -1,3 +1,5 @@
+import json
+import os
 import matplotlib.pyplot as plt
 import string
 
@@ -69,6 +71,41 @@ fee_bfs = [ [2409819.341238845, 2868218.5216704938, 4186370.90516691, 25449759.9
          [2587824.432378236, 2730321.2532242, 2575946.418133502, 3309316.565190616, 2892968.282960097]]
 # ─────────────────────────────────────────────────────────────────────────────
 
+# sweep.py's results store; when present it replaces the numbers above
+SWEEP_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sweep.json')
+# simulator report names behind the _dc, _sp and _bfs lists
+STORE_ALGORITHMS = ('bfs', 'speedy', 'source_routing')
+
+
+def load_sweep(path):
+    """
+    {(metric, algorithm): one row per sweep, one value per point} from a
+    sweep.py store; points not run yet are NaN.
+    """
+    with open(path) as f:
+        store = json.load(f)
+    table = {}
+    for metric in ('success_rate', 'hops', 'delay', 'fee'):
+        for algorithm in STORE_ALGORITHMS:
+            rows = []
+            for sweep in store['sweeps']:
+                row = []
+                for i in range(len(sweep['points'])):
+                    point = store['points'].get(f"{sweep['name']}-{i}")
+                    value = point['metrics'][algorithm][metric] if point else None
+                    row.append(float('nan') if value is None else value)
+                rows.append(row)
+            table[metric, algorithm] = rows
+    return table
+
+
+if os.path.exists(SWEEP_STORE):
+    sweep_table = load_sweep(SWEEP_STORE)
+    success_dc, success_sp, success_bfs = (sweep_table['success_rate', a] for a in STORE_ALGORITHMS)
+    hops_dc, hops_sp, hops_bfs = (sweep_table['hops', a] for a in STORE_ALGORITHMS)
+    delay_dc, delay_sp, delay_bfs = (sweep_table['delay', a] for a in STORE_ALGORITHMS)
+    fee_dc, fee_sp, fee_bfs = (sweep_table['fee', a] for a in STORE_ALGORITHMS)
+
 # Combine sweeps and labels
 sweeps_xs     = [payment_sizes, payment_sizes, payment_sizes, payment_sizes]
 sweeps_labels = ['Payment Size (sats)', 'Balance Split', 'Channel Silent Disablement', 'Saturated Channels']
@@ -0,0 +1,70 @@
+from dataclasses import dataclass, fields, replace
+from typing import Dict, Optional
+
+import config
+
+
+@dataclass(frozen=True)
+class RunConfig:
+    """
+    Settings of one simulated scenario, fixed for the whole run.
+
+    A Network carries the RunConfig it was loaded with and a CapacityOverlay
+    can carry its own, so scenarios with different settings can share one
+    loaded topology in one process. Routers, the simulator and metrics read
+    from the RunConfig of the network they are given instead of from config.
+
+    Fields are the config.py settings of the same name, lower-cased. Loading,
+    caching and process-level settings (snapshot and cache paths, backend,
+    cache sizes, LANDMARKS, worker counts of the setup and sweep pools) stay
+    in config.
+    """
+    # initial balance: share of each channel's capacity on the u side
+    split_channel_percent: float = 0.5
+
+    # T2R candidate search and tickets
+    bfs_mode: str = "hop"
+    max_candidates: int = 3000
+    bf_false_pos_rate: float = 0.0000001
+    bf_expected_items: Optional[int] = None
+    ticket_encoding: str = "bloom"
+    ticket_gcs_max_items: int = 256
+    reject_ticket: bool = False
+    reject_false_pos_rate: float = 0.01
+
+    # source routing and SpeedyMurmurs
+    bfs_route_search: str = "bidirectional"
+    num_trees: int = 1
+    dynamic_embedding: bool = False
+
+    # scenario
+    off_channels: float = 0
+    saturation_portion: float = 0
+    saturation_mode: str = 'random'
+
+    # payments
+    num_payments: int = 50000
+    min_payment: int = 100
+    max_payment: int = 1000
+    feasibility_mode: str = "live"
+    trace_path: Optional[str] = None
+    trace_zipf_exponent: float = 1.0
+    trace_pareto_alpha: float = 1.16
+    sim_workers: int = 1
+    sim_verify: bool = False
+
+    @classmethod
+    def from_module(cls, overrides: Dict = None) -> 'RunConfig':
+        """
+        The current config.py values, with `overrides` given by config name
+        (e.g. {"OFF_CHANNELS": 0.2}) on top.
+        """
+        values = {f.name: getattr(config, f.name.upper(), f.default) for f in fields(cls)}
+        for name, value in (overrides or {}).items():
+            if name.lower() not in values:
+                raise KeyError(f"{name} is not a run setting")
+            values[name.lower()] = value
+        return cls(**values)
+
+    def replace(self, **changes) -> 'RunConfig':
+        return replace(self, **changes)
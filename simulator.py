@@ -1,17 +1,35 @@
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple, Dict
-import networkx as nx
 import config
 from network import Network
 import metrics
 import config
-from network import Network
+from network import Network, load_network
+from overlay import CapacityOverlay
+from run_config import RunConfig
 from speedy_setup import set_routes
 import metrics
 from our_route import our_route
+from bfs import rank_cache, candidate_cache
+from ticket import ticket_stats
+from feasibility import FeasibilityOracle
+from workload import replay_trace
 from bfs_route import bfs_route
 from speedy_routing import route_payment as speedy_route_payment
-from tools import make_channels_offline, saturate_channels, is_there_really_a_path, not_connected_nodes
+from tools import make_channels_offline, saturate_channels, not_connected_nodes
+
+
+# routing algorithms in the order run() interleaves them, by report name
+ALGORITHMS = (
+    ("bfs", our_route),
+    ("speedy", speedy_route_payment),
+    ("source_routing", bfs_route),
+)
+
+# topology the current parallel run replays on, set in each pool worker
+_base = None
 
 
 def add_to_dict(c, d: Dict):
@@ -21,25 +39,150 @@ def add_to_dict(c, d: Dict):
         d[c] = 1
 
 
-def run():
-    net_bfs = Network(config.SNAPSHOT_PATH)
-    net_speedy = Network(config.SNAPSHOT_PATH)
-    net_sourceRouting = Network(config.SNAPSHOT_PATH)
-
-    make_channels_offline(net_bfs, config.OFF_CHANNELS)
-    make_channels_offline(net_speedy, config.OFF_CHANNELS)
-    make_channels_offline(net_sourceRouting, config.OFF_CHANNELS)
-
-    saturate_channels(net_bfs, config.SATURATION_PORTION, config.SATURATION_MODE)
-    saturate_channels(net_speedy, config.SATURATION_PORTION, config.SATURATION_MODE)
-    saturate_channels(net_sourceRouting, config.SATURATION_PORTION, config.SATURATION_MODE)
-
-    set_routes(net_speedy)
-    blacklist = not_connected_nodes(net_speedy)
-    del net_bfs.graph
-    del net_speedy.graph
-    del net_sourceRouting.graph
-    nodes = list(net_bfs.nodes)
+def _scenario(base: Network, run_config: RunConfig) -> CapacityOverlay:
+    # the scenario's balances and offline and saturated channels (both seeded)
+    scenario = CapacityOverlay(base, run_config)
+    make_channels_offline(scenario, run_config.off_channels)
+    saturate_channels(scenario, run_config.saturation_portion, run_config.saturation_mode)
+    return scenario
+
+
+def _algorithm_net(scenario: CapacityOverlay, name: str) -> CapacityOverlay:
+    net = CapacityOverlay(scenario)
+    if name == "speedy":
+        set_routes(net)
+    return net
+
+
+def _oracle(nets: List, base: Network) -> FeasibilityOracle:
+    # payments come from a pre-generated trace or the oracle's own RNG, so
+    # they do not depend on routing randomness
+    trace_path = nets[0].run_config.trace_path
+    trace = replay_trace(trace_path, base) if trace_path else None
+    return FeasibilityOracle(nets, base.nodes, not_connected_nodes(base), seed=88, candidates=trace)
+
+
+def _replay(nets: Dict[str, Network], payments: List[Tuple[str, str, int]]) -> Dict[str, List]:
+    """
+    Route a fixed payment list with each algorithm in `nets`, payment by payment.
+    Only our_route draws from the global RNG, so the results of one algorithm
+    do not depend on which others run alongside it. The list is known up
+    front, so our_route's ranks are computed a cache-full of payments at a
+    time, batched per amount class (RankCache.prefetch).
+    """
+    results = {name: [] for name in nets}
+    ranks = rank_cache(nets["bfs"]) if "bfs" in nets else None
+    block = ranks.max_entries if ranks is not None else 0
+    random.seed(88)
+    for i, (src, dst, amt) in enumerate(payments):
+        if block > 0 and i % block == 0:
+            ranks.prefetch(payments[i:i + block], nets["bfs"].run_config.bfs_mode)
+        for name, route in ALGORITHMS:
+            if name in nets:
+                results[name].append(route(nets[name], src, dst, amt))
+    return results
+
+
+def _init_worker(snapshot_path: str, base_config: RunConfig, settings: Dict) -> None:
+    global _base
+    for key, value in settings.items():
+        setattr(config, key, value)
+    if _base is None:
+        # not inherited from the parent (spawn start method)
+        _base = load_network(snapshot_path, base_config)
+
+
+def _simulate_worker(name: str, payments: List[Tuple[str, str, int]], run_config: RunConfig):
+    started = time.perf_counter()
+    net = _algorithm_net(_scenario(_base, run_config), name)
+    ticket_stats.reset()
+    results = _replay({name: net}, payments)[name]
+    extras = None
+    if name == "bfs":
+        extras = (ticket_stats, rank_cache(_base).counters(), candidate_cache(_base).counters())
+    return results, extras, time.perf_counter() - started
+
+
+def run_parallel(base: Network = None, run_config: RunConfig = None, workers: int = None):
+    """
+    Simulate run_config.num_payments payments with every routing algorithm,
+    each in its own process (default run_config.sim_workers of them).
+
+    Algorithms can only run apart if they route the same payments, so this
+    needs run_config.feasibility_mode "scenario": the list is fixed up front
+    by vetting candidates against the scenario, exactly as run() picks them
+    in that mode. Each worker rebuilds the scenario on the shared topology
+    and replays the list; the results are reported as run() reports them.
+    With run_config.sim_verify the serial run() is simulated in this process
+    as well and the results compared. `base` and `run_config` default as in
+    run().
+    """
+    global _base
+    run_config = run_config or (base.run_config if base is not None else RunConfig.from_module())
+    if run_config.feasibility_mode != "scenario":
+        raise ValueError(
+            "parallel runs vet payments against the scenario only; "
+            "set FEASIBILITY_MODE = 'scenario' (serial runs then pick the same payments)"
+        )
+    if base is None:
+        base = load_network(config.SNAPSHOT_PATH, run_config)
+    workers = min(run_config.sim_workers if workers is None else workers, len(ALGORITHMS))
+
+    scenario = _scenario(base, run_config)
+    oracle = _oracle([scenario], base)
+    payments = []
+    while len(payments) < run_config.num_payments:
+        payment = oracle.next_payment()
+        if payment is None:
+            # trace exhausted
+            break
+        payments.append(payment)
+
+    started = time.perf_counter()
+    settings = {key: value for key, value in vars(config).items() if key.isupper()}
+    # forked workers inherit the loaded topology instead of reading the snapshot again
+    _base = base
+    try:
+        with ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(base.snapshot_path, base.run_config, settings),
+        ) as pool:
+            futures = {
+                name: pool.submit(_simulate_worker, name, payments, run_config) for name, _ in ALGORITHMS
+            }
+            outcomes = {name: future.result() for name, future in futures.items()}
+    finally:
+        _base = None
+    wall = time.perf_counter() - started
+
+    if run_config.sim_verify:
+        serial, _ = _simulate(base, run_config)
+        for name, _ in ALGORITHMS:
+            if outcomes[name][0] != serial[name]:
+                raise RuntimeError(f"{name}: parallel results differ from the serial run")
+
+    tickets, ranks, dags = outcomes["bfs"][1]
+    metrics.report(outcomes["bfs"][0], "bfs", tickets, run_config)
+    metrics.report(outcomes["speedy"][0], "speedy", run_config=run_config)
+    metrics.report(outcomes["source_routing"][0], "source_routing", run_config=run_config)
+    metrics.report_cache(ranks, "Rank Cache")
+    metrics.report_cache(dags, "Candidate Cache")
+    metrics.report_feasibility(oracle)
+    metrics.report_workers({name: outcome[2] for name, outcome in outcomes.items()}, wall, workers)
+    return {name: outcome[0] for name, outcome in outcomes.items()}
+
+
+def _simulate(base: Network, run_config: RunConfig):
+    # the serial run: every payment drawn and routed by all algorithms in turn
+    scenario = _scenario(base, run_config)
+
+    net_bfs = _algorithm_net(scenario, "bfs")
+    net_speedy = _algorithm_net(scenario, "speedy")
+    net_sourceRouting = _algorithm_net(scenario, "source_routing")
+
+    if run_config.feasibility_mode == "scenario":
+        oracle = _oracle([scenario], base)
+    else:
+        oracle = _oracle([net_bfs, net_speedy, net_sourceRouting], base)
 
     bfs_results = []
     speedy_results = []
@@ -47,22 +190,15 @@ def run():
     bf1_size = dict()
     bf2_size = dict()
 
+    ticket_stats.reset()
     random.seed(88)
-    for counter in range(config.NUM_PAYMENTS):
+    for counter in range(run_config.num_payments):
         print(counter)
-        src, dst = random.sample(nodes, 2)
-        amt = random.randint(config.MIN_PAYMENT, config.MAX_PAYMENT)
-
-        while True:
-            bfs, _ = is_there_really_a_path(net_bfs, src, dst, amt)
-            speedy, _ = is_there_really_a_path(net_speedy, src, dst, amt)
-            sr, _ = is_there_really_a_path(net_sourceRouting, src, dst, amt)
-
-            if bfs and speedy and sr and src not in blacklist and dst not in blacklist and src != dst:
-                break
-
-            src, dst = random.sample(nodes, 2)
-            amt = random.randint(config.MIN_PAYMENT, config.MAX_PAYMENT)
+        payment = oracle.next_payment()
+        if payment is None:
+            # trace exhausted
+            break
+        src, dst, amt = payment
 
         bfs_results.append((our_route(net_bfs, src, dst, amt)))
         speedy_results.append((speedy_route_payment(net_speedy, src, dst, amt)))
@@ -74,9 +210,39 @@ def run():
         #     print(src, dst, amt)
         #     return
 
-    metrics.report(bfs_results, "bfs")
-    metrics.report(speedy_results, "speedy")
-    metrics.report(sr_results, "source_routing")
+    return {"bfs": bfs_results, "speedy": speedy_results, "source_routing": sr_results}, oracle
+
+
+def run(base: Network = None, run_config: RunConfig = None):
+    """
+    Simulate run_config.num_payments payments with every routing algorithm.
+
+    All algorithms share one loaded topology (`base`, loaded from
+    config.SNAPSHOT_PATH when not given). The scenario's balances and
+    offline and saturated channels live in one overlay on top of it and each
+    algorithm's balance changes in its own overlay above that, so `base` is
+    left untouched and can be reused for the next scenario. `run_config`
+    holds the scenario's settings (default: base's, or the current config.py
+    values when loading). With run_config.sim_workers > 1 the algorithms run
+    in separate processes (see run_parallel).
+
+    Returns each algorithm's per-payment results, by report name.
+    """
+    run_config = run_config or (base.run_config if base is not None else RunConfig.from_module())
+    if run_config.sim_workers > 1:
+        return run_parallel(base, run_config)
+    if base is None:
+        base = load_network(config.SNAPSHOT_PATH, run_config)
+
+    results, oracle = _simulate(base, run_config)
+
+    metrics.report(results["bfs"], "bfs", ticket_stats, run_config)
+    metrics.report(results["speedy"], "speedy", run_config=run_config)
+    metrics.report(results["source_routing"], "source_routing", run_config=run_config)
+    metrics.report_cache(rank_cache(base), "Rank Cache")
+    metrics.report_cache(candidate_cache(base), "Candidate Cache")
+    metrics.report_feasibility(oracle)
+    return results
 
     
 
@@ -0,0 +1,309 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from collections import defaultdict
+from typing import Dict, List
+
+import config
+from network import Channel, iter_snapshot_entries
+
+
+MAGIC = b'LNSNAP01'
+# bump whenever the section layout below changes
+FORMAT_VERSION = 1
+_ALIGN = 8
+
+# name -> array typecode, in on-disk order
+# per-direction columns have two slots per channel: [2c] for the u side, [2c+1] for v
+_SECTIONS = [
+    ('chan_u', 'I'),
+    ('chan_v', 'I'),
+    ('total_capacity', 'q'),
+    ('flags', 'B'),
+    ('message_flags', 'B'),
+    ('base_fee', 'q'),
+    ('fee_rate', 'q'),
+    ('htlc_min', 'q'),
+    ('htlc_max', 'q'),
+    ('delay', 'q'),
+    ('adj_offsets', 'I'),
+    ('adj_edges', 'I'),
+    ('adj_order', 'I'),
+    ('rev_offsets', 'I'),
+    ('rev_edges', 'I'),
+]
+_BLOBS = ['node_ids', 'chan_ids']
+
+FLAG_BI = 1
+FLAG_DISABLED = 2
+
+# compiled snapshots already opened in this process, keyed by absolute source path
+_opened: Dict[str, 'CompiledSnapshot'] = {}
+
+
+class CompiledSnapshot:
+    """
+    Read-only view of a compiled listchannels snapshot.
+
+    Nodes are dense indices into `node_ids` (sorted pubkeys) and channels are
+    indices into `chan_ids` (snapshot order). An edge id is `2 * channel + d`,
+    where d = 0 is the u->v direction and d = 1 is v->u. `adj_*` / `rev_*` are
+    CSR arrays of edge ids leaving / entering each node, in the same order the
+    JSON loader produces `Network.adj` and `Network.rev_adj`.
+    Numeric columns are memoryviews over an mmap of the cache file.
+    """
+
+    def __init__(self, path: str, header: dict, buf):
+        self.path = path
+        self.header = header
+        self._buf = buf
+        view = memoryview(buf)
+        for name, typecode in _SECTIONS:
+            offset, length = header['sections'][name]
+            setattr(self, name, view[offset:offset + length].cast(typecode))
+        for name in _BLOBS:
+            offset, length = header['sections'][name]
+            text = bytes(view[offset:offset + length]).decode('utf-8')
+            setattr(self, name, text.split('\n') if text else [])
+        self.num_nodes = header['num_nodes']
+        self.num_channels = header['num_channels']
+
+    def edge_source(self, e: int) -> int:
+        c = e >> 1
+        return self.chan_v[c] if e & 1 else self.chan_u[c]
+
+    def edge_target(self, e: int) -> int:
+        c = e >> 1
+        return self.chan_u[c] if e & 1 else self.chan_v[c]
+
+
+def cache_path(snapshot_path: str) -> str:
+    cache_dir = getattr(config, 'SNAPSHOT_CACHE_DIR', None)
+    if cache_dir is None:
+        return snapshot_path + '.bin'
+    return os.path.join(cache_dir, os.path.basename(snapshot_path) + '.bin')
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _fingerprint(path: str) -> dict:
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def compile_snapshot(snapshot_path: str, out_path: str = None) -> str:
+    """
+    Parse a listchannels snapshot once and write its compiled binary form.
+
+    Applies exactly the filtering and direction merging of `Network._load_snapshot`.
+    Returns the path of the written cache file.
+    """
+    out_path = out_path or cache_path(snapshot_path)
+    fingerprint = _fingerprint(snapshot_path)
+
+    channels: Dict[str, Channel] = {}
+    edges: List[int] = []              # edge ids in snapshot order
+    chan_index: Dict[str, int] = {}
+    for entry in iter_snapshot_entries(snapshot_path):
+        if not isinstance(entry, dict):
+            continue
+        # balances are not compiled, only the totals
+        chan = Channel(entry, 0.5)
+        if not chan.public or not chan.active:
+            continue
+        if chan.id in channels:
+            existing = channels[chan.id]
+            existing.update(entry)
+            edges.append(2 * chan_index[chan.id] + (chan.u != existing.u))
+        else:
+            chan_index[chan.id] = len(channels)
+            channels[chan.id] = chan
+            edges.append(2 * chan_index[chan.id])
+
+    chans = list(channels.values())
+    node_ids = sorted({n for chan in chans for n in (chan.u, chan.v)})
+    node_index = {node: i for i, node in enumerate(node_ids)}
+
+    cols = {name: array(typecode) for name, typecode in _SECTIONS}
+    for chan in chans:
+        cols['chan_u'].append(node_index[chan.u])
+        cols['chan_v'].append(node_index[chan.v])
+        cols['total_capacity'].append(chan.total_capacity)
+        cols['flags'].append((FLAG_BI if chan.bi else 0) | (FLAG_DISABLED if chan.disabled else 0))
+        cols['message_flags'].append(chan.message_flags & 0xff)
+        cols['base_fee'].extend((chan.base_fee_msat_u, chan.base_fee_msat_v))
+        cols['fee_rate'].extend((chan.fee_proportional_millionths_u, chan.fee_proportional_millionths_v))
+        cols['htlc_min'].extend((chan.htlc_min_msat_u, chan.htlc_min_msat_v))
+        cols['htlc_max'].extend((chan.htlc_max_msat_u, chan.htlc_max_msat_v))
+        cols['delay'].extend((chan.delay_u, chan.delay_v))
+
+    def source(e):
+        return cols['chan_v'][e >> 1] if e & 1 else cols['chan_u'][e >> 1]
+
+    def target(e):
+        return cols['chan_u'][e >> 1] if e & 1 else cols['chan_v'][e >> 1]
+
+    out_edges = defaultdict(list)
+    for e in edges:
+        out_edges[source(e)].append(e)
+    # rev_adj is built by scanning nodes in sorted order, then each node's adj list
+    in_edges = defaultdict(list)
+    for x in range(len(node_ids)):
+        for e in out_edges.get(x, []):
+            in_edges[target(e)].append(e)
+    for name, lists in (('adj', out_edges), ('rev', in_edges)):
+        offsets, flat = cols[name + '_offsets'], cols[name + '_edges']
+        offsets.append(0)
+        for x in range(len(node_ids)):
+            flat.extend(lists.get(x, []))
+            offsets.append(len(flat))
+    # Network.adj is keyed in first-seen order, which ties in degree sorts depend on
+    cols['adj_order'].extend(out_edges.keys())
+
+    blobs = {
+        'node_ids': '\n'.join(node_ids).encode('utf-8'),
+        'chan_ids': '\n'.join(chan.id for chan in chans).encode('utf-8'),
+    }
+    payload = [(name, cols[name].tobytes()) for name, _ in _SECTIONS]
+    payload += [(name, blobs[name]) for name in _BLOBS]
+
+    header = {
+        'version': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'itemsizes': {typecode: array(typecode).itemsize for _, typecode in _SECTIONS},
+        'source': os.path.abspath(snapshot_path),
+        'sha256': _file_digest(snapshot_path),
+        'num_nodes': len(node_ids),
+        'num_channels': len(chans),
+    }
+    header.update(fingerprint)
+    relative = {}
+    offset = 0
+    for name, data in payload:
+        relative[name] = offset
+        offset += -(-len(data) // _ALIGN) * _ALIGN
+    # section offsets are absolute, so grow the data start until the header fits before it
+    data_start = 0
+    while True:
+        header['sections'] = {name: [data_start + relative[name], len(data)] for name, data in payload}
+        header_bytes = json.dumps(header).encode('utf-8')
+        needed = -(-(len(MAGIC) + 8 + len(header_bytes)) // _ALIGN) * _ALIGN
+        if needed <= data_start:
+            break
+        data_start = needed
+    header_bytes += b' ' * (data_start - len(MAGIC) - 8 - len(header_bytes))
+
+    # write-then-rename so concurrent runs never observe a half-written cache
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        for name, data in payload:
+            f.write(data)
+            f.write(b'\0' * (-len(data) % _ALIGN))
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _read_header(f) -> dict:
+    if f.read(len(MAGIC)) != MAGIC:
+        return None
+    size = int.from_bytes(f.read(8), 'little')
+    try:
+        return json.loads(f.read(size))
+    except ValueError:
+        return None
+
+
+def _is_current(header: dict, snapshot_path: str) -> bool:
+    if header is None or header.get('version') != FORMAT_VERSION:
+        return False
+    if header.get('byteorder') != sys.byteorder:
+        return False
+    if any(array(t).itemsize != size for t, size in header.get('itemsizes', {}).items()):
+        return False
+    fingerprint = _fingerprint(snapshot_path)
+    if all(header.get(k) == v for k, v in fingerprint.items()):
+        return True
+    # touched or copied but possibly unchanged: fall back to the content hash
+    return header.get('size') == fingerprint['size'] and header.get('sha256') == _file_digest(snapshot_path)
+
+
+def _restamp(path: str, magic: bytes, fingerprint: dict) -> bool:
+    """
+    Rewrite the source fingerprint in the JSON header of the cache file at
+    `path` (MAGIC, header length, header, payload), keeping the header
+    length so every payload offset stays put. False if the new header does
+    not fit.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            return False
+        size = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(size))
+        header.update(fingerprint)
+        header_bytes = json.dumps(header).encode('utf-8')
+        if len(header_bytes) > size:
+            return False
+        # write-then-rename, as in compile_snapshot
+        with open(tmp_path, 'wb') as out:
+            out.write(magic)
+            out.write(size.to_bytes(8, 'little'))
+            out.write(header_bytes + b' ' * (size - len(header_bytes)))
+            shutil.copyfileobj(f, out)
+    os.replace(tmp_path, path)
+    return True
+
+
+def load_compiled(snapshot_path: str) -> CompiledSnapshot:
+    """
+    Open the compiled form of `snapshot_path`, compiling it first if the cache
+    is missing or no longer matches the source file.
+
+    The mapping is shared by every caller in the process, so building several
+    Network instances from one snapshot parses it at most once.
+    """
+    key = os.path.abspath(snapshot_path)
+    fingerprint = _fingerprint(snapshot_path)
+    snap = _opened.get(key)
+    if snap is not None and snap.fingerprint == fingerprint:
+        return snap
+
+    path = cache_path(snapshot_path)
+    header = None
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            header = _read_header(f)
+    if not _is_current(header, snapshot_path):
+        compile_snapshot(snapshot_path, path)
+    elif any(header.get(k) != v for k, v in fingerprint.items()):
+        # current by content hash only (the source was touched): record the
+        # new stat so later loads skip hashing it again
+        if not _restamp(path, MAGIC, fingerprint):
+            compile_snapshot(snapshot_path, path)
+
+    with open(path, 'rb') as f:
+        header = _read_header(f)
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    snap = CompiledSnapshot(path, header, buf)
+    snap.fingerprint = fingerprint
+    _opened[key] = snap
+    return snap
+
+
+if __name__ == "__main__":
+    # one-off compile step: python snapshot_cache.py [snapshot.json ...]
+    for snapshot in sys.argv[1:] or [config.SNAPSHOT_PATH]:
+        print(compile_snapshot(snapshot))
@@ -1,7 +1,10 @@
 import random
 import config
+from array import array
 from collections import deque
-from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+from embedding import TreeEmbedding
 from network import Network
 
 def select_landmarks_by_degree(net: Network, k: int) -> List[str]:
@@ -25,71 +28,105 @@ def select_landmarks_by_degree(net: Network, k: int) -> List[str]:
     return [node for node, _ in sorted_nodes[:k]]
 
 
-def set_routes(net: Network) -> None:
+# link bits in the tree-building topology
+_BIDIRECTIONAL = 1
+_NONZERO = 2
+
+# topology of the current set_routes call, set in each pool worker
+_topology = None
+
+
+def _tree_topology(net: Network):
     """
-    Build coordinate trees rooted at each landmark using the SpeedyMurmurs algorithm.
-    Phase 1: use only bidirectional links to assign most nodes.
-    Phase 2: attach remaining nodes via any non-zero link to ensure full coverage.
+    The static part of `net` the tree BFS reads, over node slots: CSR
+    neighbor arrays in get_neighbors order plus a bit mask per link.
     """
-    landmarks = select_landmarks_by_degree(net, config.NUM_TREES)
-    # Reset any existing coordinates and counters
-    net.coordinates.clear()
-    net.stab_msg_count = 0
+    index = net.node_slots()
+    offsets = array('I', [0])
+    nbrs = array('I')
+    links = bytearray()
+    for node in net.nodes:
+        for nbr, cid in net.get_neighbors(node):
+            nbrs.append(index[nbr])
+            links.append(
+                (_BIDIRECTIONAL if net.is_bidirectional(cid) else 0)
+                | (_NONZERO if net.get_total_capacity(cid) > 0 else 0)
+            )
+        offsets.append(len(nbrs))
+    return offsets, nbrs, links
 
-    for tree_id, landmark in enumerate(landmarks):
-        # PHASE 1: Bidirectional-only BFS
-        assigned = set()
-        coord_map: Dict[str, List[int]] = {}
-        queue = deque()
-
-        # Initialize root coordinate
-        coord_map[landmark] = []
-        net.set_coordinate(landmark, tree_id, [])
-        assigned.add(landmark)
-        queue.append(landmark)
-        counter = 0
-        while queue:
-            counter += 1
-            current = queue.popleft()
-            cur_coord = coord_map[current]
-            for nbr, cid in net.get_neighbors(current):
-                if nbr in coord_map:
-                    continue
-                chan = net.channels[cid]
-                # Only bidirectional links
-                if chan.bi:
-                    suffix = random.getrandbits(
-                        config.COORD_BITS if hasattr(config, 'COORD_BITS') else 64
-                    )
-                    # suffix = 1
-                    new_coord = cur_coord + [suffix]
-                    coord_map[nbr] = new_coord
-                    net.set_coordinate(nbr, tree_id, new_coord)
-                    assigned.add(nbr)
-                    queue.append(nbr)
-
-        # PHASE 2: Unidirectional links for remaining nodes
-        queue = deque(assigned)
+
+def build_tree(topology, root: int) -> Tuple[array, array]:
+    """
+    Two-phase SpeedyMurmurs BFS from slot `root` over a _tree_topology.
+    Phase 1: use only bidirectional links to assign most nodes.
+    Phase 2: attach remaining nodes via any non-zero link, scanning the
+    phase 1 nodes in slot order.
+    Returns (parent, depth) slot arrays, -1 for the root's parent and for
+    nodes left out.
+    """
+    offsets, nbrs, links = topology
+    n = len(offsets) - 1
+    parent = array('i', [-1]) * n
+    depth = array('i', [-1]) * n
+    depth[root] = 0
+    for mask, queue in ((_BIDIRECTIONAL, deque([root])), (_NONZERO, None)):
+        if queue is None:
+            queue = deque(x for x in range(n) if depth[x] >= 0)
         while queue:
-            counter += 1
             current = queue.popleft()
-            cur_coord = coord_map[current]
-            for nbr, cid in net.get_neighbors(current):
-                if nbr in coord_map:
+            for k in range(offsets[current], offsets[current + 1]):
+                nbr = nbrs[k]
+                if depth[nbr] >= 0 or not links[k] & mask:
                     continue
-                chan = net.channels[cid]
-                # Allow any non-zero link
-                if chan.total_capacity > 0:
-                    suffix = random.getrandbits(
-                        config.COORD_BITS if hasattr(config, 'COORD_BITS') else 64
-                    )
-                    new_coord = cur_coord + [suffix]
-                    coord_map[nbr] = new_coord
-                    net.set_coordinate(nbr, tree_id, new_coord)
-                    assigned.add(nbr)
-                    queue.append(nbr)
+                parent[nbr] = current
+                depth[nbr] = depth[current] + 1
+                queue.append(nbr)
+    return parent, depth
+
+
+def _init_worker(topology) -> None:
+    global _topology
+    _topology = topology
+
+
+def _build_tree_worker(root: int) -> Tuple[bytes, bytes]:
+    parent, depth = build_tree(_topology, root)
+    return parent.tobytes(), depth.tobytes()
+
+
+def set_routes(net: Network, workers: int = None) -> None:
+    """
+    Build coordinate trees rooted at each landmark using the SpeedyMurmurs algorithm.
+
+    With more than one worker (default config.SETUP_WORKERS) the trees are
+    built in a process pool, each worker holding one copy of the read-only
+    topology. A tree depends only on the topology and its root, so the
+    result is the same for any worker count.
+    """
+    landmarks = select_landmarks_by_degree(net, net.run_config.num_trees)
+    # Reset any existing trees and counters
+    net.embeddings.clear()
+    net.stab_msg_count = 0
+    if not landmarks:
+        return
 
+    index = net.node_slots()
+    roots = [index[landmark] for landmark in landmarks]
+    topology = _tree_topology(net)
+    workers = min(config.SETUP_WORKERS if workers is None else workers, len(roots))
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(topology,)) as pool:
+            trees = []
+            for parent, depth in pool.map(_build_tree_worker, roots):
+                trees.append((array('i', parent), array('i', depth)))
+    else:
+        trees = [build_tree(topology, root) for root in roots]
 
+    for tree_id, (root, (parent, depth)) in enumerate(zip(roots, trees)):
+        net.embeddings[tree_id] = TreeEmbedding.from_arrays(net.nodes, index, root, parent, depth)
+        # one stabilization message per node placed, as set_parent counts them
+        net.stab_msg_count += sum(1 for d in depth if d >= 0)
 
 
 def random_partition(amount: int, parts: int) -> List[int]:
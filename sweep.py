@@ -0,0 +1,176 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from typing import Dict, List, Tuple
+
+import config
+import metrics
+import simulator
+from network import Network, load_network
+from run_config import RunConfig
+
+
+# bump whenever the store layout below changes
+FORMAT_VERSION = 1
+# config settings that pick the loaded topology; points agreeing on them share it
+_TOPOLOGY_SETTINGS = ("SNAPSHOT_PATH", "SNAPSHOT_CACHE", "SNAPSHOT_CACHE_DIR", "NETWORK_BACKEND")
+
+# (name, axis label, config overrides per point), in results/plot.py's row order;
+# every other setting keeps its config.py value
+SWEEPS: List[Tuple[str, str, List[Dict]]] = [
+    ("payment_size", "Payment Size (sats)", [
+        {"MIN_PAYMENT": 1, "MAX_PAYMENT": 100},
+        {"MIN_PAYMENT": 100, "MAX_PAYMENT": 1000},
+        {"MIN_PAYMENT": 1000, "MAX_PAYMENT": 10000},
+        {"MIN_PAYMENT": 10000, "MAX_PAYMENT": 100000},
+        {"MIN_PAYMENT": 100000, "MAX_PAYMENT": 1000000},
+    ]),
+    ("balance_split", "Balance Split (%)", [
+        {"SPLIT_CHANNEL_PERCENT": p} for p in (0.6, 0.7, 0.8, 0.9, 1.0)
+    ]),
+    ("silent_disablement", "Channel Silent Disablement (%)", [
+        {"OFF_CHANNELS": p} for p in (0.1, 0.2, 0.3, 0.4, 0.5)
+    ]),
+    ("saturation", "Saturated Channels (%)", [
+        {"SATURATION_PORTION": p} for p in (0.1, 0.2, 0.3, 0.4, 0.5)
+    ]),
+]
+
+
+def point_key(sweep: str, i: int) -> str:
+    return f"{sweep}-{i}"
+
+
+def _settings() -> Dict:
+    # every config value a point depends on (not the sweep's own knobs)
+    return {
+        key: value for key, value in vars(config).items()
+        if key.isupper() and not key.startswith("SWEEP_")
+    }
+
+
+def load_store(path: str) -> Dict:
+    """
+    The sweep results at `path`, or an empty store if there are none yet.
+    """
+    if os.path.exists(path):
+        with open(path) as f:
+            store = json.load(f)
+        if store.get("version") == FORMAT_VERSION:
+            return store
+    return {"version": FORMAT_VERSION, "sweeps": [], "points": {}}
+
+
+def save_store(store: Dict, path: str) -> None:
+    # write-then-rename, so an interrupted sweep never leaves a torn store
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(store, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# topologies loaded in this process, by _TOPOLOGY_SETTINGS values
+_bases: Dict[tuple, Network] = {}
+
+
+def _run_point(settings: Dict, out_prefix: str):
+    # a pool worker runs many points, so every setting is applied, not just the overrides
+    for key, value in settings.items():
+        setattr(config, key, value)
+    run_config = RunConfig.from_module()
+    # scenario settings live in run_config, so the points a worker runs
+    # share one loaded topology (and its rank caches and landmark table)
+    topology = tuple(settings[key] for key in _TOPOLOGY_SETTINGS)
+    base = _bases.get(topology)
+    if base is None:
+        base = _bases[topology] = load_network(config.SNAPSHOT_PATH, run_config)
+    argv = sys.argv
+    # metrics.report names its per-payment CSVs after argv[1]
+    sys.argv = [argv[0], out_prefix]
+    started = time.perf_counter()
+    try:
+        with open(out_prefix + ".log", "w") as log, redirect_stdout(log):
+            results = simulator.run(base, run_config)
+    finally:
+        sys.argv = argv
+    return {name: metrics.summary(r) for name, r in results.items()}, time.perf_counter() - started
+
+
+def run_sweep(sweeps: List[Tuple[str, str, List[Dict]]] = None, path: str = None, workers: int = None) -> Dict:
+    """
+    Simulate every point of `sweeps` (default SWEEPS) that `path` (default
+    config.SWEEP_STORE) does not already hold, `workers` points at a time
+    (default config.SWEEP_WORKERS, None = one per CPU).
+
+    A point is done when the store has its metrics for exactly the settings
+    it would run with now, so rerunning after an interruption or after
+    adding points only simulates what is missing, and changing config.py
+    reruns the points it affects. The store is rewritten after each point.
+    Each point also leaves its simulator output and per-payment CSVs under
+    <store>.d/. Returns the store.
+    """
+    sweeps = SWEEPS if sweeps is None else sweeps
+    path = path or config.SWEEP_STORE
+    workers = workers or config.SWEEP_WORKERS or os.cpu_count()
+    store = load_store(path)
+    store["sweeps"] = [
+        {"name": name, "label": label, "points": points} for name, label, points in sweeps
+    ]
+    out_dir = path + ".d"
+    os.makedirs(out_dir, exist_ok=True)
+
+    base_settings = _settings()
+    todo = {}
+    for name, _, points in sweeps:
+        for i, overrides in enumerate(points):
+            key = point_key(name, i)
+            settings = dict(base_settings, **overrides)
+            done = store["points"].get(key)
+            if done is not None and done["settings"] == settings:
+                continue
+            todo[key] = (name, i, overrides, settings)
+    print(f"{len(todo)} of {sum(len(points) for _, _, points in sweeps)} points to run")
+    save_store(store, path)
+    if not todo:
+        return store
+
+    failed = 0
+    with ProcessPoolExecutor(min(workers, len(todo))) as pool:
+        futures = {
+            pool.submit(_run_point, settings, os.path.join(out_dir, key)): key
+            for key, (_, _, _, settings) in todo.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            name, i, overrides, settings = todo[key]
+            try:
+                summaries, seconds = future.result()
+            except Exception as exc:
+                failed += 1
+                print(f"{key} failed: {exc!r}")
+                continue
+            store["points"][key] = {
+                "sweep": name,
+                "index": i,
+                "overrides": overrides,
+                "settings": settings,
+                "metrics": summaries,
+                "seconds": seconds,
+            }
+            save_store(store, path)
+            print(f"{key} done in {seconds:.1f} s")
+    if failed:
+        print(f"{failed} points failed; rerun to retry them")
+    return store
+
+
+if __name__ == "__main__":
+    # python sweep.py [workers [store.json]]
+    args = sys.argv[1:]
+    run_sweep(
+        workers=int(args[0]) if args else None,
+        path=args[1] if len(args) > 1 else None,
+    )
@@ -0,0 +1,538 @@
+import math
+import time
+from array import array
+from typing import Dict, Iterable, List, Set, Tuple
+
+from run_config import RunConfig
+
+
+_MASK64 = (1 << 64) - 1
+_MASK32 = (1 << 32) - 1
+
+# released bit buffers by byte size, reused by the next ticket of that size
+_free: Dict[int, List[bytearray]] = {}
+_zeros: Dict[int, bytes] = {}
+
+
+def _mix(key: int) -> int:
+    # splitmix64 finaliser: spreads consecutive integer edge keys over 64 bits
+    x = key & _MASK64
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _acquire(nbytes: int) -> bytearray:
+    free = _free.get(nbytes)
+    if free:
+        return free.pop()
+    return bytearray(nbytes)
+
+
+def _release(buf: bytearray) -> None:
+    nbytes = len(buf)
+    zeros = _zeros.get(nbytes)
+    if zeros is None:
+        zeros = _zeros[nbytes] = bytes(nbytes)
+    buf[:] = zeros
+    _free.setdefault(nbytes, []).append(buf)
+
+
+def _bloom_bits(num_items: int, fp_rate: float) -> float:
+    return -max(1, num_items) * math.log(fp_rate) / (math.log(2) ** 2)
+
+
+def _pow2_bytes(bits: float, minimum: int) -> int:
+    nbytes = minimum
+    while nbytes * 8 < bits:
+        nbytes <<= 1
+    return nbytes
+
+
+def _fingerprint_bits(fp_rate: float) -> int:
+    return min(32, max(1, math.ceil(-math.log2(fp_rate))))
+
+
+# reject-ticket rebuilds at a tenth of the rate before giving up on one
+_REJECT_ATTEMPTS = 8
+
+
+# Every encoding answers `key in ticket`, reports its wire size as `num_bits`
+# and its key count as `num_keys`, and is built with `from_keys(keys, fp_rate)`;
+# `estimate_bits` lets "auto" pick one before building.
+
+class BloomTicket:
+    """
+    Bloom filter over integer edge keys (Network.edge_key), sized for the
+    number of edges the ticket actually holds.
+
+    The bit array is a power-of-two number of bytes taken from a pool, so
+    tickets of similar size reuse buffers; call release() when done.
+    Probe i is mix(mix(key) + i): independent probes, because double
+    hashing has a false-positive floor near n / m^2 that small tickets hit
+    long before the configured rate.
+    """
+
+    name = "bloom"
+
+    def __init__(self, num_items: int, fp_rate: float):
+        num_items = max(1, num_items)
+        nbytes = _pow2_bytes(_bloom_bits(num_items, fp_rate), 8)
+        self.num_bits = nbytes * 8
+        # a buffer rounded up already beats fp_rate; more probes than its optimum only cost time
+        self.num_hashes = max(1, min(
+            round(self.num_bits / num_items * math.log(2)),
+            math.ceil(-math.log2(fp_rate)),
+        ))
+        self.bits = _acquire(nbytes)
+
+    @classmethod
+    def from_keys(cls, keys: List[int], fp_rate: float, expected: int = None) -> "BloomTicket":
+        ticket = cls(expected or len(keys), fp_rate)
+        ticket.add_many(keys)
+        ticket.num_keys = len(keys)
+        return ticket
+
+    @staticmethod
+    def estimate_bits(num_items: int, fp_rate: float) -> int:
+        return _pow2_bytes(_bloom_bits(num_items, fp_rate), 8) * 8
+
+    def add_many(self, keys: Iterable[int]) -> None:
+        bits, m, k = self.bits, self.num_bits, self.num_hashes
+        for key in keys:
+            h = _mix(key)
+            for i in range(k):
+                pos = _mix(h + i) % m
+                bits[pos >> 3] |= 1 << (pos & 7)
+
+    def add(self, key: int) -> None:
+        self.add_many((key,))
+
+    def __contains__(self, key: int) -> bool:
+        bits, m = self.bits, self.num_bits
+        h = _mix(key)
+        for i in range(self.num_hashes):
+            pos = _mix(h + i) % m
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def release(self) -> None:
+        if self.bits is not None:
+            _release(self.bits)
+            self.bits = None
+
+
+class BlockedBloomTicket(BloomTicket):
+    """
+    Bloom filter whose probes for a key all land in one 512-bit block chosen
+    by the key's hash. Blocks fill unevenly, so it is sized 25% above a plain
+    filter for the same rate.
+    """
+
+    name = "blocked"
+    BLOCK_BITS = 512
+
+    def __init__(self, num_items: int, fp_rate: float):
+        num_items = max(1, num_items)
+        nbytes = self._nbytes(num_items, fp_rate)
+        self.num_bits = nbytes * 8
+        self.num_blocks = self.num_bits // self.BLOCK_BITS
+        per_block = num_items / self.num_blocks
+        self.num_hashes = max(1, min(
+            round(self.BLOCK_BITS / per_block * math.log(2)),
+            math.ceil(-math.log2(fp_rate)),
+        ))
+        self.bits = _acquire(nbytes)
+
+    @classmethod
+    def _nbytes(cls, num_items: int, fp_rate: float) -> int:
+        return _pow2_bytes(1.25 * _bloom_bits(num_items, fp_rate), cls.BLOCK_BITS // 8)
+
+    @classmethod
+    def estimate_bits(cls, num_items: int, fp_rate: float) -> int:
+        return cls._nbytes(num_items, fp_rate) * 8
+
+    def add_many(self, keys: Iterable[int]) -> None:
+        bits, k, blocks = self.bits, self.num_hashes, self.num_blocks
+        for key in keys:
+            h = _mix(key)
+            base = (h % blocks) * 512
+            for i in range(k):
+                pos = base + (_mix(h + i) & 511)
+                bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: int) -> bool:
+        bits = self.bits
+        h = _mix(key)
+        base = (h % self.num_blocks) * 512
+        for i in range(self.num_hashes):
+            pos = base + (_mix(h + i) & 511)
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+
+class XorTicket:
+    """
+    Xor filter (Graf & Lemire): each key maps to one slot in each of three
+    segments and the f-bit fingerprints of those slots xor to the key's
+    fingerprint. About 1.23 * f bits per key for a 2^-f false-positive rate,
+    with three probes per lookup. Built by peeling; a failed peel retries
+    with the next seed.
+    """
+
+    name = "xor"
+
+    def __init__(self, keys: List[int], fp_rate: float):
+        keys = list(set(keys))
+        self.num_keys = len(keys)
+        self.fp_bits = _fingerprint_bits(fp_rate)
+        self._fp_mask = (1 << self.fp_bits) - 1
+        self.segment = (int(1.23 * len(keys)) + 32) // 3 + 1
+        self.num_bits = 3 * self.segment * self.fp_bits
+        self.seed = 0
+        while not self._build(keys):
+            self.seed += 1
+
+    @classmethod
+    def from_keys(cls, keys: List[int], fp_rate: float, expected: int = None) -> "XorTicket":
+        return cls(keys, fp_rate)
+
+    @staticmethod
+    def estimate_bits(num_items: int, fp_rate: float) -> int:
+        return 3 * ((int(1.23 * num_items) + 32) // 3 + 1) * _fingerprint_bits(fp_rate)
+
+    def _hash(self, key: int) -> int:
+        return _mix(key + self.seed * 0x9e3779b97f4a7c15)
+
+    def _slots(self, h: int):
+        seg = self.segment
+        return (
+            ((h & _MASK32) * seg) >> 32,
+            seg + ((((h >> 21) & _MASK32) * seg) >> 32),
+            2 * seg + ((((h >> 42) | (h << 22)) & _MASK32) * seg >> 32),
+        )
+
+    def _build(self, keys: List[int]) -> bool:
+        size = 3 * self.segment
+        count = [0] * size
+        xor_hash = [0] * size
+        hashes = [self._hash(key) for key in keys]
+        for h in hashes:
+            for s in self._slots(h):
+                count[s] += 1
+                xor_hash[s] ^= h
+        queue = [s for s in range(size) if count[s] == 1]
+        order = []
+        while queue:
+            s = queue.pop()
+            if count[s] != 1:
+                continue
+            h = xor_hash[s]
+            order.append((h, s))
+            for t in self._slots(h):
+                count[t] -= 1
+                xor_hash[t] ^= h
+                if count[t] == 1:
+                    queue.append(t)
+        if len(order) != len(hashes):
+            return False
+        fps = array('I', bytes(4 * size))
+        mask = self._fp_mask
+        for h, s in reversed(order):
+            a, b, c = self._slots(h)
+            fps[s] = ((h ^ (h >> 32)) & mask) ^ fps[a] ^ fps[b] ^ fps[c]
+        self.fingerprints = fps
+        return True
+
+    def __contains__(self, key: int) -> bool:
+        h = self._hash(key)
+        a, b, c = self._slots(h)
+        fps = self.fingerprints
+        return ((h ^ (h >> 32)) & self._fp_mask) == fps[a] ^ fps[b] ^ fps[c]
+
+    def release(self) -> None:
+        pass
+
+
+class GCSTicket:
+    """
+    Golomb-coded set: key hashes reduced to [0, n * 2^r), sorted, and the
+    gaps Rice-coded with parameter r = ceil(log2(1 / fp_rate)). The most
+    compact encoding here (about r + 1.5 bits per key), but a reader has to
+    decode the whole set; that happens on the first lookup. The codes are
+    packed most significant bit first into the `code` byte buffer.
+    """
+
+    name = "gcs"
+
+    def __init__(self, keys: List[int], fp_rate: float):
+        self.r = _fingerprint_bits(fp_rate)
+        self.num_keys = len(set(keys))
+        self.range = max(1, self.num_keys) << self.r
+        values = sorted({_mix(key) % self.range for key in keys})
+        code = bytearray()
+        r, mask = self.r, (1 << self.r) - 1
+        # bits not yet flushed to `code` sit at the bottom of `pending`
+        pending, npending, nbits, prev = 0, 0, 0, 0
+        for v in values:
+            d = v - prev
+            prev = v
+            q = d >> r
+            # q ones, a zero, then the low r bits
+            pending = (pending << (q + 1 + r)) | ((((1 << q) - 1) << 1) << r) | (d & mask)
+            npending += q + 1 + r
+            nbits += q + 1 + r
+            while npending >= 8:
+                npending -= 8
+                code.append((pending >> npending) & 0xFF)
+            pending &= (1 << npending) - 1
+        if npending:
+            code.append((pending << (8 - npending)) & 0xFF)
+        self.code = code
+        self.num_bits = nbits
+        self._decoded: Set[int] = None
+
+    @classmethod
+    def from_keys(cls, keys: List[int], fp_rate: float, expected: int = None) -> "GCSTicket":
+        return cls(keys, fp_rate)
+
+    @staticmethod
+    def estimate_bits(num_items: int, fp_rate: float) -> int:
+        return int(max(1, num_items) * (_fingerprint_bits(fp_rate) + 1.5))
+
+    def _decode(self) -> Set[int]:
+        code, nbits = self.code, self.num_bits
+        values = set()
+        pos, prev, r = 0, 0, self.r
+        mask = (1 << r) - 1
+        while pos < nbits:
+            q = 0
+            while code[pos >> 3] & (0x80 >> (pos & 7)):
+                q += 1
+                pos += 1
+            pos += 1
+            # the r low bits, read from the bytes that span them
+            end = (pos + r + 7) >> 3
+            low = (int.from_bytes(code[pos >> 3:end], 'big') >> (end * 8 - pos - r)) & mask
+            pos += r
+            prev += (q << r) | low
+            values.add(prev)
+        return values
+
+    def __contains__(self, key: int) -> bool:
+        if self._decoded is None:
+            self._decoded = self._decode()
+        return _mix(key) % self.range in self._decoded
+
+    def release(self) -> None:
+        pass
+
+
+ENCODINGS = {cls.name: cls for cls in (BloomTicket, BlockedBloomTicket, XorTicket, GCSTicket)}
+
+
+def choose_encoding(num_items: int, fp_rate: float, gcs_max_items: int) -> type:
+    """
+    Encoding with the fewest estimated bits for this many keys. GCS is left
+    out above `gcs_max_items` keys, where decoding it at every hop costs
+    more than the bytes it saves.
+    """
+    options = [
+        cls for cls in ENCODINGS.values()
+        if cls is not GCSTicket or num_items <= gcs_max_items
+    ]
+    return min(options, key=lambda cls: cls.estimate_bits(num_items, fp_rate))
+
+
+def encode_ticket(keys: List[int], fp_rate: float, run_config: RunConfig, encoding: str = None):
+    encoding = encoding or run_config.ticket_encoding
+    if encoding == "auto":
+        cls = choose_encoding(len(keys), fp_rate, run_config.ticket_gcs_max_items)
+    else:
+        cls = ENCODINGS[encoding]
+    return cls.from_keys(keys, fp_rate, run_config.bf_expected_items)
+
+
+def ticket_keys(net, channels) -> List[int]:
+    """
+    Distinct edge keys of every candidate channel in `channels`
+    (node -> [(neighbor, channel)]); parallel channels share a key.
+    """
+    edge_key = net.edge_key
+    return list(dict.fromkeys(edge_key(c, nei) for c, cands in channels.items() for nei, _ in cands))
+
+
+def build_ticket(net, channels, keys: List[int] = None):
+    """
+    Ticket of a sub-payment: the candidate edges, encoded with the
+    ticket_encoding of net.run_config and sized for them (Bloom encodings
+    use its bf_expected_items instead when that is set).
+    """
+    if keys is None:
+        keys = ticket_keys(net, channels)
+    return encode_ticket(keys, net.run_config.bf_false_pos_rate, net.run_config)
+
+
+def false_positive_edges(net, channels, ticket) -> Set[int]:
+    """
+    Keys of edges at candidate nodes that pass `ticket` without being
+    candidates, i.e. what a reject ticket would have to hold.
+    """
+    out = set()
+    edge_key = net.edge_key
+    for c, cands in channels.items():
+        chosen = {nei for nei, _ in cands}
+        for nei, _ in net.get_neighbors(c):
+            if nei in chosen:
+                continue
+            key = edge_key(c, nei)
+            if key in ticket:
+                out.add(key)
+    return out
+
+
+def build_reject_ticket(net, channels, ticket, keys: List[int] = None):
+    """
+    Reject ticket: the edges at candidate nodes that pass `ticket` without
+    being candidates. None when there are none.
+
+    A reject-ticket false positive would hide a real candidate, so the filter
+    is rebuilt at a tenth of the rate until no candidate key hits it; together
+    the two tickets are then exact at every candidate node. If that takes
+    more than _REJECT_ATTEMPTS rebuilds, or a lower rate no longer changes
+    the filter (xor and GCS fingerprints stop at 32 bits), there is no reject
+    ticket either and forwarding tests the primary alone.
+    """
+    rejects = false_positive_edges(net, channels, ticket)
+    if not rejects:
+        return None
+    if keys is None:
+        keys = ticket_keys(net, channels)
+    rejects = list(rejects)
+    rate = net.run_config.reject_false_pos_rate
+    shape = None
+    for _ in range(_REJECT_ATTEMPTS):
+        reject = encode_ticket(rejects, rate, net.run_config)
+        if not any(key in reject for key in keys):
+            return reject
+        reject.release()
+        previous, shape = shape, (type(reject), reject.num_bits, getattr(reject, 'num_hashes', None))
+        if shape == previous:
+            break
+        rate /= 10
+    return None
+
+
+class ForwardingTable:
+    """
+    The (neighbor, channel) entries each node would forward a sub-payment on:
+    those whose edge passes the ticket and not the reject ticket. A node's
+    list is built once, the first time the payment reaches it.
+
+    Candidate edges (and their parallel channels) pass without a lookup.
+    With a reject ticket the pair is exact at candidate nodes, so their lists
+    come straight from `channels` and cost O(ticket edges at the node);
+    otherwise the node's other neighbors are tested once, in one pass, so
+    false-positive forwarding is still simulated.
+    """
+
+    def __init__(self, net, channels, ticket, reject=None):
+        self.net = net
+        self.channels = channels
+        self.ticket = ticket
+        self.reject = reject
+        self._edges: Dict[str, List[Tuple[str, str]]] = {}
+
+    def edges_at(self, node) -> List[Tuple[str, str]]:
+        edges = self._edges.get(node)
+        if edges is None:
+            edges = self._edges[node] = self._build(node)
+        return edges
+
+    def _build(self, node) -> List[Tuple[str, str]]:
+        net, cands = self.net, self.channels.get(node)
+        if cands is not None and self.reject is not None:
+            return [
+                (nei, cid)
+                for nei in dict.fromkeys(nei for nei, _ in cands)
+                for cid in net.find_channel_ids(node, nei)
+            ]
+        chosen = {nei for nei, _ in cands} if cands else ()
+        edge_key, lookup = net.edge_key, ticket_stats.lookup
+        ticket, reject = self.ticket, self.reject
+        out = []
+        for nei, cid in net.get_neighbors(node):
+            if nei not in chosen:
+                key = edge_key(node, nei)
+                if not lookup(ticket, key):
+                    continue
+                if reject is not None and lookup(reject, key):
+                    ticket_stats.reject_hits += 1
+                    continue
+            out.append((nei, cid))
+        return out
+
+
+class TicketStats:
+    """
+    Running totals over the sub-payment tickets built in a simulation.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.tickets = 0
+        self.build_seconds = 0.0
+        self.ticket_bits = 0
+        # bytes on the wire per ticket (primary + reject), rounded up per filter
+        self.ticket_bytes = 0
+        self.max_ticket_bytes = 0
+        self.encodings: Dict[str, int] = {}
+        self.reject_tickets = 0
+        self.reject_bits = 0
+        # false-positive edges at candidate nodes carried by reject tickets
+        self.rejected_edges = 0
+        # edges outside candidate nodes the reject ticket turned away while forwarding
+        self.reject_hits = 0
+        self.lookups = 0
+        self.lookup_seconds = 0.0
+        self.forward_seconds = 0.0
+
+    def record_build(self, ticket, reject, seconds: float) -> None:
+        self.tickets += 1
+        self.build_seconds += seconds
+        self.ticket_bits += ticket.num_bits
+        self.encodings[ticket.name] = self.encodings.get(ticket.name, 0) + 1
+        nbytes = (ticket.num_bits + 7) // 8
+        if reject is not None:
+            self.reject_tickets += 1
+            self.reject_bits += reject.num_bits
+            self.rejected_edges += reject.num_keys
+            nbytes += (reject.num_bits + 7) // 8
+        self.ticket_bytes += nbytes
+        self.max_ticket_bytes = max(self.max_ticket_bytes, nbytes)
+
+    def lookup(self, ticket, key: int) -> bool:
+        """
+        `key in ticket`, timed.
+        """
+        start = time.perf_counter()
+        found = key in ticket
+        self.lookup_seconds += time.perf_counter() - start
+        self.lookups += 1
+        return found
+
+    def record_forward(self, ticket, reject, seconds: float) -> None:
+        """
+        Add a sub-payment's forwarding time and hand its tickets back to the pool.
+        """
+        self.forward_seconds += seconds
+        ticket.release()
+        if reject is not None:
+            reject.release()
+
+
+ticket_stats = TicketStats()
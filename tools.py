@@ -3,19 +3,22 @@ from typing import List, Tuple
 import csv
 import random
 from collections import deque
-import networkx as nx
 
 
-def commit_capacity(net: Network, path: List[str], amount: int) -> None:
+def commit_capacity(net: Network, hops: List[Tuple[str, str, str]], amount: int) -> None:
     """
-    Commit reserved capacity along path, turning reservation into real reduction.
+    Commit reserved capacity along a route given as (u, v, channel_id) hops,
+    turning reservation into real reduction on the channels actually used.
+    With dynamic_embedding in net.run_config, SpeedyMurmurs trees on `net`
+    are stabilized for every channel a direction of which drained or refilled.
     """
-    for i in range(len(path) - 1):
-        u, v = path[i], path[i+1]
-        cid = net.find_channel_id(u, v)
-        if cid in net.channels:
-            net.channels[cid].increase_capacity(v, amount)
-            net.channels[cid].reduce_capacity(u, amount)
+    dynamic = net.run_config.dynamic_embedding and getattr(net, 'embeddings', None)
+    for u, v, cid in hops:
+        was_open = net.directions_open(cid) if dynamic else None
+        net.increase_capacity(cid, v, amount)
+        net.reduce_capacity(cid, u, amount)
+        if dynamic:
+            net.restabilize(cid, was_open)
 
 
 def load_data(path):
@@ -43,9 +46,7 @@ def saturate_channels(net: Network, saturation_rate: float, mode: str):
         for k in betweenness:
             if k[0] in seen:
                 continue
-            channel = net.channels[k[2]]
-            channel.capacity_uv = channel.total_capacity
-            channel.capacity_vu = 0
+            net.saturate_channel(net.channel_by_id(k[2]))
             c += 1
             seen.add(k[0])
             if c > to_saturate:
@@ -53,13 +54,12 @@ def saturate_channels(net: Network, saturation_rate: float, mode: str):
 
     elif mode == 'random':
         random.seed(49)
-        saturated_count = int(saturation_rate * len(net.channels))
+        channels = net.channel_ids()
+        saturated_count = int(saturation_rate * len(channels))
         counter = 0
-        channels = list(net.channels.values())
         while counter < saturated_count:
             channel = random.choice(channels)
-            channel.capacity_uv = channel.total_capacity
-            channel.capacity_vu = 0
+            net.saturate_channel(channel)
             channels.remove(channel)
             counter += 1
     elif mode == 'per_node':
@@ -70,9 +70,7 @@ def saturate_channels(net: Network, saturation_rate: float, mode: str):
             counter = 0
             while counter < to_saturate:
                 neighbor = random.choice(neighbors)
-                channel = net.channels[neighbor[1]]
-                channel.capacity_uv = channel.total_capacity
-                channel.capacity_vu = 0
+                net.saturate_channel(neighbor[1])
                 neighbors.remove(neighbor)
                 counter += 1
 
@@ -89,6 +87,8 @@ def is_there_really_a_path(
     visited = {src}
  
     prev = {}
+    # size and HTLC bounds are already applied by the view; only balance and online vary
+    adj = net.admissible_adj(amount_sat)
 
     while queue:
         u = queue.popleft()
@@ -104,19 +104,14 @@ def is_there_really_a_path(
 
             return True, path
 
-        for v, cid in net.get_neighbors(u):
+        for v, cid in adj.get(u, ()):
             if v in visited:
                 continue
 
-            chan = net.channels[cid]
-            if not chan.online:
+            if not net.is_online(cid):
                 continue
-            # 1) capacity check
-            if chan.get_capacity(u) < amount_sat:
-                continue
-            # 2) HTLC‐min/max (convert sats → msat)
-            msat = amount_sat * 1_000
-            if msat < chan.get_htlc_min_msat(u) or msat > chan.get_htlc_max_msat(u):
+            # capacity check
+            if net.get_capacity(cid, u) < amount_sat:
                 continue
 
             visited.add(v)
@@ -132,27 +127,73 @@ def make_channels_offline(net: Network, off_channels: int):
     random.seed(42)
     if off_channels == 0:
         return
-    offline_count = int(off_channels * len(net.channels))
+    channels = net.channel_ids()
+    offline_count = int(off_channels * len(channels))
     counter = 0
-    channels = list(net.channels.values())
     while counter < offline_count:
         channel = random.choice(channels)
-        channel.online = False
+        net.set_online(channel, False)
         channels.remove(channel)
         counter += 1
 
 
-def not_connected_nodes(net: Network):
-    G = net.graph
-    cc = list(nx.strongly_connected_components(G))
-    cc = sorted(cc, key=len, reverse=True)
-    cc_large = cc[0]
+def strongly_connected_components(net: Network) -> List[List[str]]:
+    """
+    Strongly connected components of the channel graph (every adjacency
+    entry counts), found with an iterative Tarjan walk straight over `adj`.
+    Components come out in reverse topological order.
+    """
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+    for root in net.nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(net.get_neighbors(root)))]
+        while work:
+            node, neighbors = work[-1]
+            descended = False
+            for v, _ in neighbors:
+                if v not in index:
+                    index[v] = low[v] = counter
+                    counter += 1
+                    stack.append(v)
+                    on_stack.add(v)
+                    work.append((v, iter(net.get_neighbors(v))))
+                    descended = True
+                    break
+                if v in on_stack and index[v] < low[node]:
+                    low[node] = index[v]
+            if descended:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if low[node] < low[parent]:
+                    low[parent] = low[node]
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    component.append(w)
+                    if w == node:
+                        break
+                components.append(component)
+    return components
 
-    blacklist = []
-    for n in net.nodes:
-        if n not in cc_large:
-            blacklist.append(n)
 
-    return blacklist
+def not_connected_nodes(net: Network):
+    cc = strongly_connected_components(net)
+    cc_large = set(max(cc, key=len))
+
+    return {n for n in net.nodes if n not in cc_large}
 
     
\ No newline at end of file
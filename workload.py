@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import random
+import struct
+import sys
+from itertools import accumulate
+from typing import Iterator, List, Optional, Tuple
+
+import config
+from network import Network, load_network
+from run_config import RunConfig
+
+
+MAGIC = b'LNTRACE1'
+# bump whenever the record layout below changes
+FORMAT_VERSION = 1
+# src slot, dst slot, amount (sats)[, timestamp (s)]
+_RECORD = struct.Struct('<IIq')
+_TIMED_RECORD = struct.Struct('<IIqd')
+# records decoded per read while replaying
+_CHUNK = 4096
+
+
+def _node_names(net: Network) -> List[str]:
+    # pubkeys in slot order, whichever backend loaded the snapshot
+    return list(getattr(net, 'node_ids', None) or net.nodes)
+
+
+def _nodes_digest(names: List[str]) -> str:
+    return hashlib.sha256('\n'.join(names).encode('utf-8')).hexdigest()
+
+
+# ───────── Distributions ──────────────────────────────────────────
+# An endpoint distribution returns per-slot weights (None = uniform); an
+# amount distribution draws a whole column of amounts at once. Both take
+# their parameters from the trace's RunConfig.
+
+def _uniform_weights(rng: random.Random, n: int, run_config: RunConfig) -> Optional[List[float]]:
+    return None
+
+
+def _zipf_weights(rng: random.Random, n: int, run_config: RunConfig) -> Optional[List[float]]:
+    # a random popularity order, weight of rank r is 1 / r**s
+    ranks = list(range(1, n + 1))
+    rng.shuffle(ranks)
+    s = run_config.trace_zipf_exponent
+    return [r ** -s for r in ranks]
+
+
+def _uniform_amounts(rng: random.Random, count: int, run_config: RunConfig) -> List[int]:
+    lo, hi = run_config.min_payment, run_config.max_payment
+    return [rng.randint(lo, hi) for _ in range(count)]
+
+
+def _pareto_amounts(rng: random.Random, count: int, run_config: RunConfig) -> List[int]:
+    # Pareto from min_payment, capped at max_payment
+    lo, hi = run_config.min_payment, run_config.max_payment
+    alpha = run_config.trace_pareto_alpha
+    return [min(hi, int(lo * rng.paretovariate(alpha))) for _ in range(count)]
+
+
+ENDPOINT_DISTRIBUTIONS = {'uniform': _uniform_weights, 'zipf': _zipf_weights}
+AMOUNT_DISTRIBUTIONS = {'uniform': _uniform_amounts, 'pareto': _pareto_amounts}
+
+
+def _draw_slots(rng: random.Random, n: int, weights, count: int) -> List[int]:
+    if weights is None:
+        return [int(rng.random() * n) for _ in range(count)]
+    return rng.choices(range(n), cum_weights=list(accumulate(weights)), k=count)
+
+
+def generate_trace(
+    net: Network,
+    path: str,
+    count: int,
+    seed: int = 88,
+    sources: str = 'uniform',
+    destinations: str = 'uniform',
+    amounts: str = 'uniform',
+    rate: float = None,
+    run_config: RunConfig = None,
+) -> str:
+    """
+    Write `count` payments (src, dst, amount[, timestamp]) for `net` to `path`.
+
+    Each column is drawn in one pass from its distribution (see
+    ENDPOINT_DISTRIBUTIONS / AMOUNT_DISTRIBUTIONS); rows with src == dst get
+    a new destination. Amount bounds and distribution parameters come from
+    `run_config` (default net.run_config). With `rate` (payments per second)
+    every record also carries a Poisson arrival time. The same seed and
+    settings give the same trace.
+    """
+    run_config = run_config or net.run_config
+    rng = random.Random(seed)
+    names = _node_names(net)
+    n = len(names)
+    if n < 2:
+        raise ValueError("a trace needs at least two nodes")
+    src_weights = ENDPOINT_DISTRIBUTIONS[sources](rng, n, run_config)
+    dst_weights = ENDPOINT_DISTRIBUTIONS[destinations](rng, n, run_config)
+    src = _draw_slots(rng, n, src_weights, count)
+    dst = _draw_slots(rng, n, dst_weights, count)
+    clash = [i for i in range(count) if src[i] == dst[i]]
+    while clash:
+        for i, slot in zip(clash, _draw_slots(rng, n, dst_weights, len(clash))):
+            dst[i] = slot
+        clash = [i for i in clash if src[i] == dst[i]]
+    amount = AMOUNT_DISTRIBUTIONS[amounts](rng, count, run_config)
+
+    header = {
+        'version': FORMAT_VERSION,
+        'num_nodes': n,
+        'nodes_sha256': _nodes_digest(names),
+        'count': count,
+        'timed': rate is not None,
+        'seed': seed,
+        'sources': sources,
+        'destinations': destinations,
+        'amounts': amounts,
+        'rate': rate,
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        if rate is None:
+            f.write(b''.join(_RECORD.pack(*row) for row in zip(src, dst, amount)))
+        else:
+            t = 0.0
+            times = []
+            for _ in range(count):
+                t += rng.expovariate(rate)
+                times.append(t)
+            f.write(b''.join(_TIMED_RECORD.pack(*row) for row in zip(src, dst, amount, times)))
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_header(path: str) -> dict:
+    with open(path, 'rb') as f:
+        return _read_header(f, path)
+
+
+def _read_header(f, path: str) -> dict:
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{path} is not a payment trace")
+    header = json.loads(f.read(int.from_bytes(f.read(8), 'little')))
+    if header.get('version') != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported trace version {header.get('version')}")
+    return header
+
+
+def replay_trace(path: str, net: Network) -> Iterator[Tuple[str, str, int, Optional[float]]]:
+    """
+    Stream the payments of a trace as (src, dst, amount, timestamp) in
+    `net`'s node ids, reading a chunk of records at a time. The timestamp is
+    None for untimed traces. The trace must have been generated for the
+    same node set (either backend).
+    """
+    nodes = net.nodes
+    with open(path, 'rb') as f:
+        header = _read_header(f, path)
+        if header['num_nodes'] != len(nodes) or header['nodes_sha256'] != _nodes_digest(_node_names(net)):
+            raise ValueError(f"{path} was generated for a different snapshot")
+        record = _TIMED_RECORD if header['timed'] else _RECORD
+        while True:
+            block = f.read(record.size * _CHUNK)
+            if not block:
+                return
+            for row in record.iter_unpack(block):
+                yield nodes[row[0]], nodes[row[1]], row[2], row[3] if len(row) > 3 else None
+
+
+if __name__ == "__main__":
+    # one-off generation: python workload.py out.trace [count [sources [destinations [amounts [rate]]]]]
+    args = sys.argv[1:]
+    if not args:
+        sys.exit("usage: python workload.py out.trace [count [sources [destinations [amounts [rate]]]]]")
+    out = args[0]
+    # candidates, not accepted payments: the simulator turns infeasible ones away
+    count = int(args[1]) if len(args) > 1 else config.NUM_PAYMENTS * 10
+    sources = args[2] if len(args) > 2 else 'uniform'
+    destinations = args[3] if len(args) > 3 else 'uniform'
+    amounts = args[4] if len(args) > 4 else 'uniform'
+    rate = float(args[5]) if len(args) > 5 else None
+    net = load_network(config.SNAPSHOT_PATH)
+    print(generate_trace(net, out, count, sources=sources, destinations=destinations, amounts=amounts, rate=rate))